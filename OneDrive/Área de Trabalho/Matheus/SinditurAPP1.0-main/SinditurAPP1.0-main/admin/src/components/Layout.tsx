@@ -80,6 +80,21 @@ export default function Layout({ children }: { children: React.ReactNode }) {
       setNotifications(prev => [notif, ...prev.slice(0, 49)])
     }))
 
+    cleanups.push(socketService.on('low_stock', (data: any) => {
+      if (!data.low_stock) return
+      const notif = {
+        id: Date.now(),
+        type: 'low_stock',
+        title: 'Estoque Baixo',
+        message: `${data.name} está com ${data.quantity} unidade(s) (mínimo ${data.min_quantity})`,
+        timestamp: new Date(),
+        read: false
+      }
+      setNotifications(prev => [notif, ...prev.slice(0, 49)])
+      playNotificationSound()
+      toast.warning(`Estoque baixo: ${data.name}`, { autoClose: 5000 })
+    }))
+
     return () => {
       clearInterval(interval)
       cleanups.forEach(cleanup => cleanup())
@@ -139,6 +154,7 @@ export default function Layout({ children }: { children: React.ReactNode }) {
       case 'new_patient': return '👤'
       case 'appointment_cancelled': return '❌'
       case 'appointment_updated': return '✅'
+      case 'low_stock': return '📦'
       default: return '🔔'
     }
   }
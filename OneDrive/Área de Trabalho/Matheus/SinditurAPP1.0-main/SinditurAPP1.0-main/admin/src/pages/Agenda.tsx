@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react'
 import { toast } from 'react-toastify'
 import { FiCheck, FiX, FiCalendar, FiMapPin, FiRefreshCw } from 'react-icons/fi'
-import { appointmentsAPI, unitsAPI, doctorsAPI } from '../services/api'
+import { appointmentsAPI, unitsAPI, doctorsAPI, nextCursor } from '../services/api'
 import { useAuth } from '../contexts/AuthContext'
 import socketService from '../services/socket'
 import './Agenda.css'
@@ -11,6 +11,8 @@ export default function Agenda() {
   const [appointments, setAppointments] = useState<any[]>([])
   const [units, setUnits] = useState<any[]>([])
   const [loading, setLoading] = useState(true)
+  const [cursor, setCursor] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [filter, setFilter] = useState('todos')
   const [selectedUnit, setSelectedUnit] = useState('')
   const [showAllDates, setShowAllDates] = useState(false)
@@ -62,17 +64,22 @@ export default function Agenda() {
     }
   }
 
+  const appointmentParams = () => {
+    const params: any = {}
+    if (filter !== 'todos') params.status = filter
+    if (selectedUnit) params.unit_id = selectedUnit
+    if (!showAllDates) params.date = todayFormatted
+    if (!isAdmin && myDoctorId) params.doctor_id = myDoctorId
+    return params
+  }
+
   const loadAppointments = async () => {
     // For non-admin users, wait until doctor ID is resolved before loading
     if (!isAdmin && !myDoctorId) return
     try {
-      const params: any = {}
-      if (filter !== 'todos') params.status = filter
-      if (selectedUnit) params.unit_id = selectedUnit
-      if (!showAllDates) params.date = todayFormatted
-      if (!isAdmin && myDoctorId) params.doctor_id = myDoctorId
-      const response = await appointmentsAPI.getAll(params)
+      const response = await appointmentsAPI.getAll(appointmentParams())
       setAppointments(response.data)
+      setCursor(nextCursor(response))
     } catch (error) {
       toast.error('Erro ao carregar agendamentos')
     } finally {
@@ -80,6 +87,20 @@ export default function Agenda() {
     }
   }
 
+  const loadMoreAppointments = async () => {
+    if (!cursor) return
+    setLoadingMore(true)
+    try {
+      const response = await appointmentsAPI.getAll({ ...appointmentParams(), cursor })
+      setAppointments(prev => [...prev, ...response.data])
+      setCursor(nextCursor(response))
+    } catch (error) {
+      toast.error('Erro ao carregar agendamentos')
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const handleUpdateStatus = async (id: string, status: string, paidValue?: number) => {
     try {
       await appointmentsAPI.update(id, { status, paid_value: paidValue })
@@ -169,7 +190,7 @@ export default function Agenda() {
       ) : (
         <>
           <div className="appointments-count">
-            {appointments.length} agendamento(s) encontrado(s)
+            {appointments.length}{cursor ? '+' : ''} agendamento(s) encontrado(s)
           </div>
           <div className="appointments-list">
             {appointments.map((apt) => (
@@ -225,6 +246,11 @@ export default function Agenda() {
               </div>
             ))}
           </div>
+          {cursor && (
+            <button className="btn-load-more" onClick={loadMoreAppointments} disabled={loadingMore}>
+              {loadingMore ? 'Carregando...' : 'Carregar mais agendamentos'}
+            </button>
+          )}
         </>
       )}
     </div>
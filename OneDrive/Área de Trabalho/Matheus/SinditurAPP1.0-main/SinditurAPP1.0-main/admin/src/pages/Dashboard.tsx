@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react'
 import { FiCalendar, FiDollarSign, FiUsers, FiPackage, FiTrendingUp } from 'react-icons/fi'
-import { appointmentsAPI, financialAPI, patientsAPI, inventoryAPI } from '../services/api'
+import { dashboardAPI } from '../services/api'
 import socketService from '../services/socket'
 import './Dashboard.css'
 
@@ -20,32 +20,26 @@ export default function Dashboard() {
     const cleanup2 = socketService.on('new_appointment', () => loadStats())
     const cleanup3 = socketService.on('appointment_cancelled', () => loadStats())
     const cleanup4 = socketService.on('appointment_updated', () => loadStats())
+    const cleanup5 = socketService.on('low_stock', () => loadStats())
 
     return () => {
       cleanup1()
       cleanup2()
       cleanup3()
       cleanup4()
+      cleanup5()
     }
   }, [])
 
   const loadStats = async () => {
     try {
-      const today = new Date().toLocaleDateString('pt-BR')
-      const [appointmentsRes, financialRes, patientsRes, inventoryRes] = await Promise.all([
-        appointmentsAPI.getAll({ date: today }),
-        financialAPI.getSummary(),
-        patientsAPI.getAll(),
-        inventoryAPI.getAll()
-      ])
-      
-      const lowStock = inventoryRes.data.filter((item: any) => item.quantity <= item.min_quantity).length
+      const response = await dashboardAPI.getStats()
       
       setStats({
-        todayAppointments: appointmentsRes.data.length,
-        monthRevenue: financialRes.data.total_revenue,
-        totalPatients: patientsRes.data.length,
-        lowStockItems: lowStock
+        todayAppointments: response.data.today_appointments,
+        monthRevenue: response.data.month_revenue,
+        totalPatients: response.data.total_patients,
+        lowStockItems: response.data.low_stock_items
       })
     } catch (error) {
       console.error('Error loading stats:', error)
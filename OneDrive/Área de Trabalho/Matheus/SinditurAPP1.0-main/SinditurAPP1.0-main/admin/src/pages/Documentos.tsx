@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react'
 import { toast } from 'react-toastify'
 import { FiFileText, FiPrinter, FiDownload, FiEdit2 } from 'react-icons/fi'
-import { documentsAPI, patientsAPI, doctorsAPI } from '../services/api'
+import { documentsAPI, patientsAPI, doctorsAPI, fetchAllPages } from '../services/api'
 import './Documentos.css'
 
 export default function Documentos() {
@@ -39,13 +39,13 @@ export default function Documentos() {
 
   const loadData = async () => {
     try {
-      const [templatesRes, patientsRes, doctorsRes] = await Promise.all([
+      const [templatesRes, allPatients, doctorsRes] = await Promise.all([
         documentsAPI.getTemplates(),
-        patientsAPI.getAll(),
+        fetchAllPages(patientsAPI.getAll, { limit: 1000 }),
         doctorsAPI.getAll()
       ])
       setTemplates(templatesRes.data)
-      setPatients(patientsRes.data)
+      setPatients(allPatients)
       setDoctors(doctorsRes.data)
     } catch (error) {
       toast.error('Erro ao carregar dados')
@@ -106,10 +106,14 @@ export default function Documentos() {
       })
       
       // Download PDF
+      const disposition = response.headers['content-disposition'] || ''
+      const match = disposition.match(/filename\*=UTF-8''([^;]+)/)
+      const url = URL.createObjectURL(response.data)
       const link = document.createElement('a')
-      link.href = `data:application/pdf;base64,${response.data.pdf_base64}`
-      link.download = response.data.filename
+      link.href = url
+      link.download = match ? decodeURIComponent(match[1]) : `${selectedTemplate}.pdf`
       link.click()
+      URL.revokeObjectURL(url)
       
       toast.success('PDF baixado!')
     } catch (error) {
@@ -30,6 +30,7 @@ export default function Equipe() {
     email: '',
     bio: '',
     photo_base64: '',
+    photo_url: '',
     available_days: [] as string[]
   })
 
@@ -102,13 +103,14 @@ export default function Equipe() {
         phone: doctor.phone || '',
         email: doctor.email || '',
         bio: doctor.bio || '',
-        photo_base64: doctor.photo_base64 || '',
+        photo_base64: '',
+        photo_url: doctor.photo_url || '',
         available_days: doctor.available_days || []
       })
     } else {
       setEditingDoctor(null)
       setDoctorFormData({
-        name: '', specialty: '', unit_id: '', cro: '', phone: '', email: '', bio: '', photo_base64: '', available_days: []
+        name: '', specialty: '', unit_id: '', cro: '', phone: '', email: '', bio: '', photo_base64: '', photo_url: '', available_days: []
       })
     }
     setShowDoctorModal(true)
@@ -144,17 +146,21 @@ export default function Equipe() {
     }
 
     // Validar foto obrigatória
-    if (!doctorFormData.photo_base64) {
+    if (!doctorFormData.photo_base64 && !doctorFormData.photo_url) {
       toast.warning('A foto do doutor é obrigatória!')
       return
     }
 
+    // Only send the photo when a new one was selected
+    const { photo_url, ...payload }: any = doctorFormData
+    if (!payload.photo_base64) delete payload.photo_base64
+
     try {
       if (editingDoctor) {
-        await doctorsAPI.update(editingDoctor.id, doctorFormData)
+        await doctorsAPI.update(editingDoctor.id, payload)
         toast.success('Doutor atualizado! A foto será exibida no app.')
       } else {
-        await doctorsAPI.create(doctorFormData)
+        await doctorsAPI.create(payload)
         toast.success('Doutor adicionado! A foto será exibida no app.')
       }
       setShowDoctorModal(false)
@@ -280,8 +286,8 @@ export default function Equipe() {
               {doctors.map((doctor) => (
                 <div key={doctor.id} className="doctor-card">
                   <div className="doctor-photo">
-                    {doctor.photo_base64 ? (
-                      <img src={`data:image/jpeg;base64,${doctor.photo_base64}`} alt={doctor.name} />
+                    {doctor.photo_url ? (
+                      <img src={`${doctor.photo_url}&size=md`} alt={doctor.name} />
                     ) : (
                       <div className="no-photo">
                         <FiCamera />
@@ -399,6 +405,8 @@ export default function Equipe() {
               <div className="photo-preview">
                 {doctorFormData.photo_base64 ? (
                   <img src={`data:image/jpeg;base64,${doctorFormData.photo_base64}`} alt="Preview" />
+                ) : doctorFormData.photo_url ? (
+                  <img src={`${doctorFormData.photo_url}&size=md`} alt="Preview" />
                 ) : (
                   <div className="photo-placeholder">
                     <FiCamera />
@@ -408,7 +416,7 @@ export default function Equipe() {
               </div>
               <div className="photo-upload-btn">
                 <label className="btn-primary">
-                  <FiCamera /> {doctorFormData.photo_base64 ? 'Alterar Foto' : 'Selecionar Foto *'}
+                  <FiCamera /> {doctorFormData.photo_base64 || doctorFormData.photo_url ? 'Alterar Foto' : 'Selecionar Foto *'}
                   <input
                     type="file"
                     accept="image/*"
@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react'
 import { toast } from 'react-toastify'
 import { FiPlus, FiMinus, FiPackage, FiFilter } from 'react-icons/fi'
-import { inventoryAPI, doctorsAPI } from '../services/api'
+import { inventoryAPI, doctorsAPI, nextCursor } from '../services/api'
 import { useAuth } from '../contexts/AuthContext'
 import './Estoque.css'
 
@@ -9,6 +9,8 @@ export default function Estoque() {
   const { user } = useAuth()
   const [items, setItems] = useState<any[]>([])
   const [movements, setMovements] = useState<any[]>([])
+  const [movementsCursor, setMovementsCursor] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [doctors, setDoctors] = useState<any[]>([])
   const [loading, setLoading] = useState(true)
   const [showAddModal, setShowAddModal] = useState(false)
@@ -63,11 +65,28 @@ export default function Estoque() {
       if (filterType !== 'todos') params.type = filterType
       const response = await inventoryAPI.getMovements(params)
       setMovements(response.data)
+      setMovementsCursor(nextCursor(response))
     } catch (error) {
       console.error(error)
     }
   }
 
+  const loadMoreMovements = async () => {
+    if (!movementsCursor) return
+    setLoadingMore(true)
+    try {
+      const params: any = { cursor: movementsCursor }
+      if (filterType !== 'todos') params.type = filterType
+      const response = await inventoryAPI.getMovements(params)
+      setMovements(prev => [...prev, ...response.data])
+      setMovementsCursor(nextCursor(response))
+    } catch (error) {
+      toast.error('Erro ao carregar movimentações')
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const handleAddItem = async () => {
     try {
       await inventoryAPI.create(newItem)
@@ -200,6 +219,11 @@ export default function Estoque() {
                   </span>
                 </div>
               ))}
+              {movementsCursor && (
+                <button className="btn-load-more" onClick={loadMoreMovements} disabled={loadingMore}>
+                  {loadingMore ? 'Carregando...' : 'Carregar mais movimentações'}
+                </button>
+              )}
             </div>
           )}
         </div>
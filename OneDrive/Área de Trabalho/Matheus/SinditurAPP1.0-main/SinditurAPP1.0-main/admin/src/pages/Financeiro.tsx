@@ -11,6 +11,8 @@ export default function Financeiro() {
   const [selectedMonth, setSelectedMonth] = useState(new Date().getMonth() + 1)
   const [selectedYear, setSelectedYear] = useState(new Date().getFullYear())
   const [selectedUnit, setSelectedUnit] = useState('')
+  const [page, setPage] = useState(1)
+  const [loadingMore, setLoadingMore] = useState(false)
 
   useEffect(() => {
     loadUnits()
@@ -32,8 +34,9 @@ export default function Financeiro() {
   const loadSummary = async () => {
     setLoading(true)
     try {
-      const response = await financialAPI.getSummary(selectedMonth, selectedYear, selectedUnit || undefined)
+      const response = await financialAPI.getSummary(selectedMonth, selectedYear, selectedUnit || undefined, { include_appointments: true, page: 1 })
       setSummary(response.data)
+      setPage(1)
     } catch (error) {
       toast.error('Erro ao carregar dados financeiros')
     } finally {
@@ -41,6 +44,24 @@ export default function Financeiro() {
     }
   }
 
+  const loadMore = async () => {
+    setLoadingMore(true)
+    try {
+      const nextPage = page + 1
+      const response = await financialAPI.getSummary(selectedMonth, selectedYear, selectedUnit || undefined, { include_appointments: true, page: nextPage })
+      setSummary({
+        ...summary,
+        appointments: [...summary.appointments, ...response.data.appointments],
+        has_more: response.data.has_more
+      })
+      setPage(nextPage)
+    } catch (error) {
+      toast.error('Erro ao carregar dados financeiros')
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const months = [
     'Janeiro', 'Fevereiro', 'Marco', 'Abril', 'Maio', 'Junho',
     'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro'
@@ -188,6 +209,11 @@ export default function Financeiro() {
                 </tbody>
               </table>
             )}
+            {summary.has_more && (
+              <button className="btn-refresh" onClick={loadMore} disabled={loadingMore}>
+                {loadingMore ? 'Carregando...' : 'Carregar mais'}
+              </button>
+            )}
           </div>
         </>
       )}
@@ -1,14 +1,17 @@
-import React, { useState, useEffect } from 'react'
+import React, { useState, useEffect, useRef } from 'react'
 import { toast } from 'react-toastify'
 import { FiSearch, FiUser, FiX, FiEdit2, FiSave, FiPhone, FiMapPin, FiCalendar, FiClock } from 'react-icons/fi'
-import { patientsAPI } from '../services/api'
+import { patientsAPI, nextCursor } from '../services/api'
 import socketService from '../services/socket'
 import './Pacientes.css'
 
 export default function Pacientes() {
   const [patients, setPatients] = useState<any[]>([])
   const [loading, setLoading] = useState(true)
+  const [cursor, setCursor] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [search, setSearch] = useState('')
+  const searchRef = useRef('')
   const [selectedPatient, setSelectedPatient] = useState<any>(null)
   const [patientDetails, setPatientDetails] = useState<any>(null)
   const [editing, setEditing] = useState(false)
@@ -17,17 +20,29 @@ export default function Pacientes() {
   const [activeTab, setActiveTab] = useState('dados')
 
   useEffect(() => {
-    loadPatients()
     const cleanup = socketService.on('new_patient', () => {
       loadPatients()
     })
     return () => cleanup()
   }, [])
 
+  // Search runs on the server so patients past the first page are found too
+  useEffect(() => {
+    searchRef.current = search
+    const timer = setTimeout(() => loadPatients(), search ? 300 : 0)
+    return () => clearTimeout(timer)
+  }, [search])
+
+  const patientParams = () => {
+    const term = searchRef.current.trim()
+    return term ? { search: term } : {}
+  }
+
   const loadPatients = async () => {
     try {
-      const response = await patientsAPI.getAll()
+      const response = await patientsAPI.getAll(patientParams())
       setPatients(response.data)
+      setCursor(nextCursor(response))
     } catch (error) {
       toast.error('Erro ao carregar pacientes')
     } finally {
@@ -35,6 +50,20 @@ export default function Pacientes() {
     }
   }
 
+  const loadMorePatients = async () => {
+    if (!cursor) return
+    setLoadingMore(true)
+    try {
+      const response = await patientsAPI.getAll({ ...patientParams(), cursor })
+      setPatients(prev => [...prev, ...response.data])
+      setCursor(nextCursor(response))
+    } catch (error) {
+      toast.error('Erro ao carregar pacientes')
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const viewPatientDetails = async (patient: any) => {
     try {
       const response = await patientsAPI.getById(patient.id)
@@ -77,11 +106,6 @@ export default function Pacientes() {
     }
   }
 
-  const filteredPatients = patients.filter(p => 
-    p.name.toLowerCase().includes(search.toLowerCase()) ||
-    p.cpf.includes(search)
-  )
-
   const getStatusColor = (status: string) => {
     switch (status) {
       case 'agendado': return '#1E88E5'
@@ -108,13 +132,13 @@ export default function Pacientes() {
 
       {loading ? (
         <div className="loading">Carregando...</div>
-      ) : filteredPatients.length === 0 ? (
+      ) : patients.length === 0 ? (
         <div className="empty">Nenhum paciente encontrado</div>
       ) : (
         <>
-          <div className="patients-count">{filteredPatients.length} paciente(s)</div>
+          <div className="patients-count">{patients.length}{cursor ? '+' : ''} paciente(s)</div>
           <div className="patients-grid">
-            {filteredPatients.map((patient) => (
+            {patients.map((patient) => (
               <div key={patient.id} className="patient-card" onClick={() => viewPatientDetails(patient)}>
                 <div className="patient-avatar">
                   <FiUser />
@@ -128,6 +152,11 @@ export default function Pacientes() {
               </div>
             ))}
           </div>
+          {cursor && (
+            <button className="btn-load-more" onClick={loadMorePatients} disabled={loadingMore}>
+              {loadingMore ? 'Carregando...' : 'Carregar mais pacientes'}
+            </button>
+          )}
         </>
       )}
 
@@ -13,6 +13,21 @@ api.interceptors.request.use((config) => {
   return config
 })
 
+// Cursor for the next page of a paginated list, or null on the last page
+export const nextCursor = (response: any): string | null => response.headers['x-next-cursor'] || null
+
+// Every row of a paginated list, following X-Next-Cursor to the last page
+export const fetchAllPages = async (get: (params: any) => Promise<any>, params: any = {}) => {
+  const rows: any[] = []
+  let cursor: string | null = null
+  do {
+    const response = await get(cursor ? { ...params, cursor } : params)
+    rows.push(...response.data)
+    cursor = nextCursor(response)
+  } while (cursor)
+  return rows
+}
+
 export const authAPI = {
   login: (email: string, password: string) => api.post('/admin/auth/login', { email, password })
 }
@@ -51,21 +66,27 @@ export const appointmentsAPI = {
 }
 
 export const financialAPI = {
-  getSummary: (month?: number, year?: number, unit_id?: string) => 
-    api.get('/admin/financial/summary', { params: { month, year, unit_id } }),
+  getSummary: (month?: number, year?: number, unit_id?: string, options?: { include_appointments?: boolean, page?: number, page_size?: number }) => 
+    api.get('/admin/financial/summary', { params: { month, year, unit_id, ...options } }),
   getDaily: (date: string) => api.get('/admin/financial/daily', { params: { date } })
 }
 
+export const dashboardAPI = {
+  getStats: (unit_id?: string) => api.get('/admin/dashboard/stats', { params: { unit_id } })
+}
+
 export const inventoryAPI = {
   getAll: () => api.get('/admin/inventory'),
+  getLowStock: () => api.get('/admin/inventory/low-stock'),
   create: (data: any) => api.post('/admin/inventory', data),
   update: (id: string, data: any) => api.put(`/admin/inventory/${id}`, data),
   addMovement: (data: any) => api.post('/admin/inventory/movement', data),
+  addMovementsBulk: (movements: any[]) => api.post('/admin/inventory/movements/bulk', { movements }),
   getMovements: (params?: any) => api.get('/admin/inventory/movements', { params })
 }
 
 export const patientsAPI = {
-  getAll: () => api.get('/admin/patients'),
+  getAll: (params?: any) => api.get('/admin/patients', { params }),
   getById: (id: string) => api.get(`/admin/patients/${id}`),
   update: (id: string, data: any) => api.put(`/admin/patients/${id}`, data)
 }
@@ -74,7 +95,7 @@ export const documentsAPI = {
   getTemplates: () => api.get('/admin/document-templates'),
   updateTemplate: (type: string, content: string) => api.put(`/admin/document-templates/${type}`, { content }),
   generate: (data: any) => api.post('/admin/documents/generate', data),
-  generatePDF: (data: any) => api.post('/admin/documents/generate-pdf', data)
+  generatePDF: (data: any) => api.post('/admin/documents/generate-pdf', data, { responseType: 'blob' })
 }
 
 export default api
@@ -31,7 +31,8 @@ class SocketService {
       'new_appointment',
       'new_patient',
       'appointment_cancelled',
-      'appointment_updated'
+      'appointment_updated',
+      'low_stock'
     ]
 
     events.forEach(event => {
@@ -0,0 +1,575 @@
+"""Maintenance commands for the Dental Clinic API.
+
+Usage:
+    python manage.py ensure-indexes
+    python manage.py explain
+    python manage.py backfill-appointment-windows
+    python manage.py rebuild-rollups
+    python manage.py verify-rollups
+    python manage.py migrate-doctor-photos
+    python manage.py claim-appointment-slots
+    python manage.py bench-auth [--count 10000]
+    python manage.py bench-login [--url http://localhost:8001] [--concurrency 50]
+    python manage.py bench-booking [--concurrency 500]
+    python manage.py bench-export [--rows 1000000]
+    python manage.py bench-availability
+    python manage.py bench-polling [--count 10000]
+    python manage.py bench-overlap [--bookings 2000] [--concurrency 20]
+    python manage.py flush-inventory-outbox
+    python manage.py bench-inventory [--concurrency 1000]
+    python manage.py bench-reminders [--count 10000]
+    python manage.py bench-pdf [--concurrency 20]
+    python manage.py bench-fanout [--url http://localhost:8001] [--clients 200] [--count 10000] [--concurrency 100]
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+import socketio
+from fastapi import HTTPException, Request
+from fastapi.security import HTTPAuthorizationCredentials
+
+import server
+
+
+async def cmd_ensure_indexes(args):
+    report = await server.ensure_indexes()
+    print(json.dumps(report, indent=2))
+    return 1 if any(r["failed"] for r in report.values()) else 0
+
+
+async def cmd_explain(args):
+    results = await server.explain_hot_queries()
+    for r in results:
+        flag = "COLLSCAN" if r["collscan"] else "ok"
+        print(f"[{flag:>8}] {r['collection']:<20} {r['query']:<40} {' -> '.join(r['stages'])}")
+    return 1 if any(r["collscan"] for r in results) else 0
+
+
+async def cmd_backfill_appointment_windows(args):
+    result = await server.backfill_appointment_windows()
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+async def cmd_rebuild_rollups(args):
+    count = await server.rebuild_financial_rollups()
+    print(f"Rebuilt financial_rollups: {count} documents")
+    return await cmd_verify_rollups(args)
+
+
+async def cmd_verify_rollups(args):
+    result = await server.verify_financial_rollups()
+    print(json.dumps(result, indent=2, default=str))
+    return 1 if result["mismatches"] else 0
+
+
+async def cmd_migrate_doctor_photos(args):
+    result = await server.migrate_doctor_photos()
+    print(json.dumps(result, indent=2))
+    return 1 if result["failed"] else 0
+
+
+async def cmd_claim_appointment_slots(args):
+    result = await server.claim_appointment_slots()
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+async def _timed(coro):
+    start = time.perf_counter()
+    try:
+        await coro
+        ok = True
+    except HTTPException:
+        ok = False
+    return ok, time.perf_counter() - start
+
+
+def _percentiles(latencies):
+    latencies = sorted(latencies)
+    return statistics.median(latencies), latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+
+
+async def cmd_bench_auth(args):
+    """/auth/me and /admin/staff latency with the principal cache and with it bypassed"""
+    staff = await server.db.staff.find_one({"email": "admin@odonto.com"})
+    if not staff:
+        print("admin@odonto.com not found; start the server once to seed it")
+        return 1
+    creds = HTTPAuthorizationCredentials(
+        scheme="Bearer", credentials=server.create_access_token(data={"sub": staff["id"], "type": "staff"})
+    )
+
+    async def me():
+        await server.get_me(await server.get_current_user(creds))
+
+    async def staff_list():
+        await server.get_all_staff(await server.get_staff_user(creds))
+
+    for label, call in (("/auth/me", me), ("/admin/staff", staff_list)):
+        for mode in ("uncached", "cached"):
+            server.principal_cache.clear()
+            latencies = []
+            for _ in range(args.count):
+                if mode == "uncached":
+                    server.principal_cache.clear()
+                start = time.perf_counter()
+                await call()
+                latencies.append((time.perf_counter() - start) * 1000)
+            p50, p99 = _percentiles(latencies)
+            print(f"{label:<13} {mode:<9} x{args.count}  p50 {p50:.3f}ms  p99 {p99:.3f}ms")
+    print(f"principal cache: {server.principal_cache.stats()}")
+    return 0
+
+
+async def cmd_bench_login(args):
+    """/api/health latency of a running server, idle and while --concurrency staff logins hash passwords"""
+    import aiohttp
+
+    async with aiohttp.ClientSession() as session:
+        async def probe(latencies, done):
+            while not done.is_set():
+                start = time.perf_counter()
+                async with session.get(f"{args.url}/api/health") as resp:
+                    await resp.read()
+                latencies.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(0.01)
+
+        async def login():
+            start = time.perf_counter()
+            async with session.post(
+                f"{args.url}/api/admin/auth/login", json={"email": "admin@odonto.com", "password": "admin123"}
+            ) as resp:
+                await resp.read()
+                return resp.status, (time.perf_counter() - start) * 1000
+
+        idle, done = [], asyncio.Event()
+        task = asyncio.create_task(probe(idle, done))
+        await asyncio.sleep(2)
+        done.set()
+        await task
+
+        loaded, done = [], asyncio.Event()
+        task = asyncio.create_task(probe(loaded, done))
+        results = await asyncio.gather(*[login() for _ in range(args.concurrency)])
+        done.set()
+        await task
+
+    failed = sum(1 for status, _ in results if status != 200)
+    for label, latencies in (("idle", idle), (f"{args.concurrency} logins", loaded)):
+        p50, p99 = _percentiles(latencies)
+        print(f"/api/health {label:<11} x{len(latencies):<4} p50 {p50:.1f}ms  p99 {p99:.1f}ms")
+    p50, p99 = _percentiles([elapsed for _, elapsed in results])
+    print(f"/api/admin/auth/login x{args.concurrency}  p50 {p50:.0f}ms  p99 {p99:.0f}ms  {failed} failed")
+    return 1 if failed else 0
+
+
+async def cmd_bench_booking(args):
+    """Fire concurrent bookings at one slot, with the current and the old check-then-insert path"""
+    doctor = (await server.catalog.all("doctors"))[0]
+    service = (await server.catalog.all("services"))[0]
+    user = {"id": f"bench-{uuid.uuid4()}", "name": "Benchmark", "cpf": ""}
+    date = (datetime.utcnow() + timedelta(days=400)).strftime("%d/%m/%Y")
+    booking = server.AppointmentCreate(
+        unit_id=doctor["unit_id"], service_id=service["id"], doctor_id=doctor["id"], date=date, time="10:00"
+    )
+
+    # The old path books 10:15 so it is not blocked by the slot claimed above
+    async def legacy():
+        existing = await server.db.appointments.find_one({
+            "doctor_id": booking.doctor_id, "date": date, "time": "10:15", "status": {"$ne": "cancelado"}
+        })
+        if existing:
+            raise HTTPException(status_code=400, detail="ocupado")
+        await server.db.appointments.insert_one({
+            "id": str(uuid.uuid4()), "user_id": user["id"], "doctor_id": booking.doctor_id,
+            "date": date, "time": "10:15", "status": "agendado"
+        })
+
+    try:
+        for label, make in (
+            ("unique index", lambda: server.create_appointment(booking, current_user=user)),
+            ("find + insert", legacy),
+        ):
+            results = await asyncio.gather(*[_timed(make()) for _ in range(args.concurrency)])
+            latencies = sorted(elapsed * 1000 for _, elapsed in results)
+            booked = sum(1 for ok, _ in results if ok)
+            print(
+                f"{label:<14} booked {booked}/{args.concurrency}  "
+                f"p50 {statistics.median(latencies):.1f}ms  p95 {latencies[int(len(latencies) * 0.95) - 1]:.1f}ms"
+            )
+    finally:
+        await server.db.appointments.delete_many({"user_id": user["id"]})
+    return 0
+
+
+async def cmd_bench_export(args):
+    """Stream a CSV and an NDJSON export of --rows synthetic appointments; reports throughput and peak memory"""
+    collection = server.db[f"bench_export_{uuid.uuid4().hex[:8]}"]
+    fields = server.APPOINTMENT_EXPORT_FIELDS
+    sort = [("starts_at", -1), ("id", -1)]
+    first = datetime(2020, 1, 1, 11)
+    try:
+        await collection.create_index(sort)
+        batch = 10000
+        for offset in range(0, args.rows, batch):
+            await collection.insert_many([
+                {
+                    "id": str(uuid.uuid4()), "date": "01/01/2020", "time": "08:00",
+                    "starts_at": first + timedelta(minutes=i), "ends_at": first + timedelta(minutes=i + 30),
+                    "status": "concluido", "user_id": f"user-{i % 5000}", "user_name": f"Paciente {i % 5000}",
+                    "user_cpf": "000.000.000-00", "unit_id": "unit-1", "unit_name": "Unidade Centro",
+                    "service_id": "service-1", "service_name": "Limpeza", "service_price": 120.0,
+                    "doctor_id": "doctor-1", "doctor_name": "Dr. Exemplo", "paid_value": 120.0,
+                    "notes": "", "created_at": first, "completed_at": first
+                }
+                for i in range(offset, min(offset + batch, args.rows))
+            ], ordered=False)
+        print(f"inserted {args.rows} rows")
+
+        for fmt in ("csv", "ndjson"):
+            start = time.perf_counter()
+            size = 0
+            async for chunk in server._stream_export(collection, {}, sort, fields, fmt):
+                size += len(chunk)
+            elapsed = time.perf_counter() - start
+
+            # Second pass under tracemalloc, which slows it down, for the peak only
+            tracemalloc.start()
+            async for chunk in server._stream_export(collection, {}, sort, fields, fmt):
+                pass
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(
+                f"{fmt:<6} {args.rows} rows, {size / 1024 / 1024:.0f} MiB in {elapsed:.1f}s "
+                f"({args.rows / elapsed:,.0f} rows/s)  peak Python memory {peak / 1024 / 1024:.1f} MiB"
+            )
+    finally:
+        await collection.drop()
+    return 0
+
+
+async def cmd_bench_availability(args):
+    """Availability lookups per second over 50 doctors x 90 days of synthetic bookings"""
+    doctors = [f"doctor-{i}" for i in range(50)]
+    first_day = datetime(2030, 1, 1)
+    dates = [(first_day + timedelta(days=i)).strftime("%d/%m/%Y") for i in range(90)]
+    rng = random.Random(42)
+    days = {}
+    for doctor_id in doctors:
+        for date in dates:
+            days[(doctor_id, date)] = [
+                {"time": t, "starts_at": first_day, "ends_at": first_day + timedelta(minutes=rng.choice([30, 60, 90]))}
+                for t in rng.sample(server.APPOINTMENT_TIMES, rng.randint(0, 8))
+            ]
+    bitmaps = server.SlotBitmaps(ttl=3600, max_days=len(days))
+    bitmaps.fill(days)
+
+    for duration in (30, 60, 90):
+        start = time.perf_counter()
+        rounds = 10
+        for _ in range(rounds):
+            for doctor_id in doctors:
+                for date in dates:
+                    bitmaps.free_times(doctor_id, date, duration)
+        elapsed = time.perf_counter() - start
+        lookups = rounds * len(doctors) * len(dates)
+        print(f"duration {duration:>3}min  {lookups} day lookups in {elapsed:.2f}s  ({lookups / elapsed:,.0f}/s)")
+    return 0
+
+
+async def cmd_bench_polling(args):
+    """Catalog polling with If-None-Match: 304 hit rate and latency, with a services write every 500 polls"""
+    routes = {
+        "/api/units": server.get_units,
+        "/api/services": server.get_services,
+        "/api/doctors": lambda request: server.get_doctors(request, unit_id=None),
+    }
+    etags = {}
+    latencies = {200: [], 304: []}
+    loads = server.catalog.loads
+    for i in range(args.count):
+        if i and i % 500 == 0:
+            server.catalog.invalidate("services", broadcast=False)
+        path = list(routes)[i % len(routes)]
+        headers = [(b"if-none-match", etags[path].encode())] if path in etags else []
+        start = time.perf_counter()
+        response = await routes[path](Request({"type": "http", "method": "GET", "path": path, "headers": headers}))
+        latencies[response.status_code].append((time.perf_counter() - start) * 1000)
+        etags[path] = response.headers["etag"]
+
+    print(f"{args.count} polls: {len(latencies[304]) / args.count:.1%} answered 304, catalog reloads {server.catalog.loads - loads}")
+    for status, values in latencies.items():
+        if values:
+            p50, p99 = _percentiles(values)
+            print(f"  {status} x{len(values):<6} p50 {p50:.3f}ms  p99 {p99:.3f}ms")
+    return 0
+
+
+async def cmd_bench_overlap(args):
+    """Random mixed-duration bookings for one doctor; checks that no two accepted ones overlap"""
+    services = [s for s in await server.catalog.all("services") if s.get("duration_minutes")]
+    doctor_id = f"bench-{uuid.uuid4()}"
+    first_day = datetime.utcnow() + timedelta(days=400)
+    dates = [(first_day + timedelta(days=i)).strftime("%d/%m/%Y") for i in range(max(args.bookings // 100, 1))]
+    rng = random.Random(7)
+
+    def booking():
+        service = rng.choice(services)
+        date, time_str = rng.choice(dates), rng.choice(server.APPOINTMENT_TIMES)
+        starts_at, ends_at = server.appointment_window(date, time_str, service["duration_minutes"])
+        return {
+            "id": str(uuid.uuid4()), "user_id": doctor_id, "doctor_id": doctor_id, "service_id": service["id"],
+            "date": date, "time": time_str, "starts_at": starts_at, "ends_at": ends_at,
+            "status": "agendado", "slot_claimed": True, "created_at": datetime.utcnow()
+        }
+
+    async def timed_reserve(apt):
+        start = time.perf_counter()
+        ok = await server.reserve_appointment(apt)
+        return ok, time.perf_counter() - start
+
+    try:
+        results = []
+        for i in range(0, args.bookings, args.concurrency):
+            batch = [booking() for _ in range(min(args.concurrency, args.bookings - i))]
+            results.extend(await asyncio.gather(*[timed_reserve(apt) for apt in batch]))
+
+        accepted = await server.db.appointments.find({"doctor_id": doctor_id}).sort("starts_at", 1).to_list(None)
+        overlaps = sum(1 for a, b in zip(accepted, accepted[1:]) if b["starts_at"] < a["ends_at"])
+        latencies = sorted(elapsed * 1000 for _, elapsed in results)
+        print(
+            f"{args.bookings} bookings over {len(dates)} days: {len(accepted)} accepted, "
+            f"{args.bookings - len(accepted)} rejected, {overlaps} overlaps  "
+            f"p50 {statistics.median(latencies):.1f}ms  p95 {latencies[int(len(latencies) * 0.95) - 1]:.1f}ms"
+        )
+    finally:
+        await server.db.appointments.delete_many({"doctor_id": doctor_id})
+    return 1 if overlaps else 0
+
+
+async def cmd_flush_inventory_outbox(args):
+    result = await server.flush_inventory_outbox()
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+async def cmd_bench_inventory(args):
+    """Parallel movements on one item; the final quantity must equal the ledger sum"""
+    staff = {"id": "bench", "name": "Benchmark"}
+    item = await server.create_inventory_item(
+        server.InventoryItemCreate(name=f"bench-{uuid.uuid4()}", quantity=100, unit="unidade"), current_user=staff
+    )
+    rng = random.Random(3)
+    movements = [
+        server.InventoryMovement(item_id=item["id"], type=rng.choice(["entrada", "saida", "saida"]), quantity=rng.randint(1, 5))
+        for _ in range(args.concurrency)
+    ]
+    try:
+        results = await asyncio.gather(*[_timed(server.add_inventory_movement(m, current_user=staff)) for m in movements])
+        final = await server.db.inventory.find_one({"id": item["id"]})
+        ledger = 0
+        async for m in server.db.inventory_movements.find({"item_id": item["id"]}):
+            ledger += server.movement_delta(m["type"], m["quantity"])
+        latencies = sorted(elapsed * 1000 for _, elapsed in results)
+        applied = sum(1 for ok, _ in results if ok)
+        consistent = final["quantity"] == ledger and final["quantity"] >= 0 and not final.get("pending_movements")
+        print(
+            f"{len(movements)} movements: {applied} applied, {len(movements) - applied} refused  "
+            f"final quantity {final['quantity']}, ledger {ledger} -> {'consistent' if consistent else 'MISMATCH'}  "
+            f"p50 {statistics.median(latencies):.1f}ms"
+        )
+    finally:
+        await server.db.inventory.delete_one({"id": item["id"]})
+        await server.db.inventory_movements.delete_many({"item_id": item["id"]})
+    return 0 if consistent else 1
+
+
+async def cmd_bench_reminders(args):
+    """Memory held by the reminder scheduler per thousand queued reminders"""
+    now = datetime.utcnow()
+    scheduler = server.ReminderScheduler(server.REMINDER_LEAD_MINUTES, server.REMINDER_REFRESH_SECONDS, server.REMINDER_GRACE_SECONDS)
+    appointments = [
+        {"id": str(uuid.uuid4()), "status": "agendado", "starts_at": now + timedelta(minutes=90 + i % 1380)}
+        for i in range(args.count)
+    ]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for apt in appointments:
+        scheduler.schedule(apt, now)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    queued = scheduler.stats()["queued"]
+    print(
+        f"{args.count} appointments, {queued} reminders queued ({server.REMINDER_LEAD_MINUTES} min leads): "
+        f"{used / 1024:.0f} KiB, {used / queued * 1000 / 1024:.1f} KiB per 1000 reminders"
+    )
+    return 0
+
+
+async def cmd_bench_pdf(args):
+    """--concurrency simultaneous document renders, inline and through the render pool, with event-loop lag"""
+    contents = [
+        f"ATESTADO DE COMPARECIMENTO\n\nAtesto que Paciente {i}, CPF 000.000.000-{i % 100:02d}, "
+        "esteve presente nesta clínica para atendimento odontológico.\n\n"
+        "Manaus - AM, 01 de Janeiro de 2025\n\n_______________________________\nDr. Exemplo\nCRO-AM 0000"
+        for i in range(args.concurrency)
+    ]
+
+    async def inline(content):
+        server.pdf_render.render_document_pdf(content)
+
+    async def pooled(content):
+        await server.pdf_pool.run(server.pdf_render.render_document_pdf, content)
+
+    async def ticker(lags, done, interval=0.005):
+        loop = asyncio.get_running_loop()
+        while not done.is_set():
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            lags.append((loop.time() - expected) * 1000)
+
+    server.pdf_render.init_worker()
+    # Spawn the workers and build their style sheets before timing
+    await asyncio.gather(*[pooled(contents[0]) for _ in range(server.pdf_pool.workers)])
+    try:
+        for label, render in (("inline", inline), ("pool", pooled)):
+            lags, done = [], asyncio.Event()
+            task = asyncio.create_task(ticker(lags, done))
+            await asyncio.sleep(0)
+            start = time.perf_counter()
+            await asyncio.gather(*[render(content) for content in contents])
+            elapsed = time.perf_counter() - start
+            done.set()
+            await task
+            p50, p99 = _percentiles(lags)
+            print(
+                f"{label:<6} {args.concurrency} renders in {elapsed:.2f}s ({args.concurrency / elapsed:.0f}/s)  "
+                f"loop lag p50 {p50:.1f}ms  p99 {p99:.1f}ms  max {max(lags):.1f}ms"
+            )
+    finally:
+        server.pdf_pool.shutdown()
+    return 0
+
+
+async def cmd_bench_fanout(args):
+    """API throughput and admin-room fan-out latency of a running deployment.
+    
+    Start the server with SOCKETIO_MANAGER=redis and uvicorn server:app
+    --workers N, then run this with the same REDIS_URL for N = 1..cores.
+    Events are published with a write-only Redis manager, so they reach the
+    admin clients through whichever worker holds their connection.
+    """
+    import aiohttp  # also needed by socketio.AsyncClient; only this command uses it
+
+    async with aiohttp.ClientSession() as session:
+        queue = asyncio.Queue()
+        for _ in range(args.count):
+            queue.put_nowait(None)
+        statuses = []
+
+        async def worker():
+            while not queue.empty():
+                queue.get_nowait()
+                async with session.get(f"{args.url}/api/health") as resp:
+                    await resp.read()
+                    statuses.append(resp.status)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+        elapsed = time.perf_counter() - start
+        failed = sum(1 for status in statuses if status != 200)
+        print(f"GET /api/health x{args.count} ({args.concurrency} concurrent): {args.count / elapsed:.0f} req/s, {failed} failed")
+
+    latencies = []
+    clients = []
+    for _ in range(args.clients):
+        client = socketio.AsyncClient(reconnection=False)
+
+        @client.on("bench_fanout")
+        async def on_fanout(data):
+            latencies.append(time.time() - data["sent_at"])
+
+        # Websocket only: with several workers, polling needs sticky sessions
+        await client.connect(args.url, transports=["websocket"])
+        await client.emit("join_admin", {})
+        clients.append(client)
+    await asyncio.sleep(1)
+
+    emitter = socketio.AsyncRedisManager(server.REDIS_URL, channel=server.SOCKETIO_CHANNEL, write_only=True)
+    rounds = 20
+    try:
+        for _ in range(rounds):
+            await emitter.emit("bench_fanout", {"sent_at": time.time()}, room="admin", namespace="/")
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(2)
+    finally:
+        await asyncio.gather(*[client.disconnect() for client in clients])
+
+    expected = rounds * len(clients)
+    if not latencies:
+        print(f"fan-out to {len(clients)} clients: no events received (is the server running with SOCKETIO_MANAGER=redis?)")
+        return 1
+    latencies = sorted(latency * 1000 for latency in latencies)
+    print(
+        f"fan-out to {len(clients)} clients x{rounds}: {len(latencies)}/{expected} delivered  "
+        f"p50 {statistics.median(latencies):.1f}ms  p99 {latencies[int(len(latencies) * 0.99) - 1]:.1f}ms"
+    )
+    return 0 if len(latencies) == expected else 1
+
+
+COMMANDS = {
+    "ensure-indexes": cmd_ensure_indexes,
+    "explain": cmd_explain,
+    "backfill-appointment-windows": cmd_backfill_appointment_windows,
+    "rebuild-rollups": cmd_rebuild_rollups,
+    "verify-rollups": cmd_verify_rollups,
+    "migrate-doctor-photos": cmd_migrate_doctor_photos,
+    "claim-appointment-slots": cmd_claim_appointment_slots,
+    "bench-auth": cmd_bench_auth,
+    "bench-login": cmd_bench_login,
+    "bench-booking": cmd_bench_booking,
+    "bench-export": cmd_bench_export,
+    "bench-availability": cmd_bench_availability,
+    "bench-polling": cmd_bench_polling,
+    "bench-overlap": cmd_bench_overlap,
+    "flush-inventory-outbox": cmd_flush_inventory_outbox,
+    "bench-inventory": cmd_bench_inventory,
+    "bench-reminders": cmd_bench_reminders,
+    "bench-pdf": cmd_bench_pdf,
+    "bench-fanout": cmd_bench_fanout,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dental Clinic API maintenance commands")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    parser.add_argument("--concurrency", type=int, help="simultaneous requests (bench-login: 50, bench-booking: 500, bench-overlap: 20, bench-inventory: 1000, bench-pdf: 20, bench-fanout: 100)")
+    parser.add_argument("--bookings", type=int, default=2000, help="bookings made by bench-overlap")
+    parser.add_argument("--rows", type=int, default=1000000, help="synthetic appointments exported by bench-export")
+    parser.add_argument("--count", type=int, default=10000, help="appointments queued by bench-reminders, requests made by bench-auth, bench-polling and bench-fanout")
+    parser.add_argument("--url", default="http://localhost:8001", help="server used by bench-login and bench-fanout")
+    parser.add_argument("--clients", type=int, default=200, help="Socket.IO clients connected by bench-fanout")
+    args = parser.parse_args()
+    if args.concurrency is None:
+        args.concurrency = {"bench-login": 50, "bench-overlap": 20, "bench-inventory": 1000, "bench-pdf": 20, "bench-fanout": 100}.get(args.command, 500)
+
+    async def run():
+        try:
+            return await COMMANDS[args.command](args)
+        finally:
+            server.client.close()
+
+    sys.exit(asyncio.run(run()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,44 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Response, Request
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, status, Response, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import IndexModel, UpdateOne, ReturnDocument, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure, DuplicateKeyError, BulkWriteError
+from gridfs.errors import NoFile
 import os
+import re
+import time
+import asyncio
 import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
+import threading
+from urllib.parse import quote
 from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import uuid
+import hashlib
 from datetime import datetime, timedelta, timezone
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 import base64
 from io import BytesIO
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage
-from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT
+from PIL import Image, ImageOps
 import socketio
 import json
+import csv
+import heapq
+import io
+from functools import lru_cache
+import zipfile
+import pdf_render
+from document_templates import TemplateCache, document_values, unknown_placeholders
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -39,17 +55,91 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt runs on a dedicated thread pool so it never blocks the event loop
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '4'))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', '64'))
 
 # Security
 security = HTTPBearer()
 
+# Largest number of documents produced by one batch request. A merged PDF
+# is rendered in chunks of DOCUMENT_BATCH_CHUNK documents, spread over the
+# render pool, so a large batch never holds a render slot for long
+DOCUMENT_BATCH_MAX = int(os.environ.get('DOCUMENT_BATCH_MAX', '500'))
+DOCUMENT_BATCH_CHUNK = int(os.environ.get('DOCUMENT_BATCH_CHUNK', '25'))
+
+# Largest number of lines accepted by /inventory/movements/bulk
+INVENTORY_BULK_MAX = int(os.environ.get('INVENTORY_BULK_MAX', '200'))
+
+# PDF rendering runs in a process pool; at most PDF_RENDER_MAX_CONCURRENCY
+# renders are in flight, further requests wait for a slot
+PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS', '2'))
+PDF_RENDER_MAX_CONCURRENCY = int(os.environ.get('PDF_RENDER_MAX_CONCURRENCY', str(PDF_RENDER_WORKERS * 2)))
+
+# Rendered PDFs are cached on disk by content hash, evicting the least
+# recently used files once the directory grows past PDF_CACHE_MAX_BYTES.
+# Workers may share the directory but each one only counts the files it has
+# seen, so the bound holds per worker: size it as total budget / workers
+PDF_CACHE_DIR = Path(os.environ.get('PDF_CACHE_DIR', str(ROOT_DIR / 'pdf_cache')))
+PDF_CACHE_MAX_BYTES = int(os.environ.get('PDF_CACHE_MAX_BYTES', str(200 * 1024 * 1024)))
+
+# Appointment reminders are pushed to the patient's room this many minutes
+# before the start; a reminder missed by more than REMINDER_GRACE_SECONDS
+# (e.g. while the server was down) is dropped rather than sent late
+REMINDER_LEAD_MINUTES = sorted({int(m) for m in os.environ.get('REMINDER_LEAD_MINUTES', '1440,60').split(',') if m.strip()}, reverse=True)
+REMINDER_REFRESH_SECONDS = int(os.environ.get('REMINDER_REFRESH_SECONDS', '600'))
+REMINDER_GRACE_SECONDS = int(os.environ.get('REMINDER_GRACE_SECONDS', '900'))
+
+# Socket.IO rooms live in process memory by default, which only reaches
+# clients of the same worker. SOCKETIO_MANAGER=redis relays emits and cache
+# invalidations between workers through Redis pub/sub on REDIS_URL
+SOCKETIO_MANAGER = os.environ.get('SOCKETIO_MANAGER', 'memory')
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+SOCKETIO_CHANNEL = os.environ.get('SOCKETIO_CHANNEL', 'sinditur-socketio')
+INVALIDATION_CHANNEL = os.environ.get('INVALIDATION_CHANNEL', 'sinditur-invalidation')
+
+# Authenticated principals are cached for this many seconds
+PRINCIPAL_CACHE_TTL = int(os.environ.get('PRINCIPAL_CACHE_TTL', '60'))
+PRINCIPAL_CACHE_SIZE = int(os.environ.get('PRINCIPAL_CACHE_SIZE', '1024'))
+
 # Brazil timezone (UTC-3)
 BRT = timezone(timedelta(hours=-3))
 
+# Start times offered by the booking flow and the weekday names used in
+# Doctor.available_days (index = datetime.weekday())
+APPOINTMENT_TIMES = [
+    "08:00", "08:30", "09:00", "09:30", "10:00", "10:30",
+    "11:00", "11:30", "14:00", "14:30", "15:00", "15:30",
+    "16:00", "16:30", "17:00", "17:30",
+]
+WEEKDAYS_PT = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"]
+
+# Longest date range accepted by /appointments/availability
+AVAILABILITY_MAX_DAYS = int(os.environ.get('AVAILABILITY_MAX_DAYS', '31'))
+
+# Doctor occupancy is kept in memory as one bit per 15-minute slot per day;
+# a day's bitmap is reloaded from the database after SLOT_BITMAP_TTL seconds
+# so bookings made through other workers show up. Only days from yesterday
+# to SLOT_BITMAP_HORIZON_DAYS ahead are cached, and at most
+# SLOT_BITMAP_MAX_DAYS (doctor, day) bitmaps are kept
+SLOT_MINUTES = 15
+SLOT_BITMAP_TTL = int(os.environ.get('SLOT_BITMAP_TTL', '60'))
+SLOT_BITMAP_MAX_DAYS = int(os.environ.get('SLOT_BITMAP_MAX_DAYS', '20000'))
+SLOT_BITMAP_HORIZON_DAYS = int(os.environ.get('SLOT_BITMAP_HORIZON_DAYS', '366'))
+
 # ==================== SOCKET.IO SETUP ====================
+def create_client_manager():
+    """Socket.IO client manager selected by SOCKETIO_MANAGER (None = in-process)"""
+    if SOCKETIO_MANAGER == 'memory':
+        return None
+    if SOCKETIO_MANAGER == 'redis':
+        return socketio.AsyncRedisManager(REDIS_URL, channel=SOCKETIO_CHANNEL)
+    raise RuntimeError(f"Unknown SOCKETIO_MANAGER: {SOCKETIO_MANAGER!r} (expected 'memory' or 'redis')")
+
 sio = socketio.AsyncServer(
     async_mode='asgi',
     cors_allowed_origins='*',
+    client_manager=create_client_manager(),
     logger=False,
     engineio_logger=False
 )
@@ -201,7 +291,8 @@ class Doctor(BaseModel):
     cro: Optional[str] = ""
     phone: Optional[str] = ""
     email: Optional[str] = ""
-    photo_base64: Optional[str] = None
+    photo_url: Optional[str] = None
+    photo_hash: Optional[str] = None
     bio: str
     available_days: List[str]
 
@@ -236,6 +327,8 @@ class AppointmentResponse(BaseModel):
     status: str
     notes: str
     paid_value: Optional[float] = 0.0
+    starts_at: Optional[datetime] = None
+    ends_at: Optional[datetime] = None
     created_at: datetime
 
 # Inventory Models
@@ -258,6 +351,9 @@ class InventoryMovement(BaseModel):
     doctor_id: Optional[str] = None
     notes: Optional[str] = ""
 
+class InventoryMovementBulk(BaseModel):
+    movements: List[InventoryMovement]
+
 # Document Template Models
 class DocumentTemplateUpdate(BaseModel):
     content: str
@@ -268,6 +364,14 @@ class DocumentGenerate(BaseModel):
     doctor_id: str
     custom_fields: Optional[dict] = {}
 
+class DocumentBatchGenerate(BaseModel):
+    template_type: str
+    appointment_ids: Optional[List[str]] = None
+    date: Optional[str] = None  # DD/MM/YYYY, used when appointment_ids is not given
+    doctor_id: Optional[str] = None
+    custom_fields: Optional[dict] = {}
+    format: str = "pdf"  # pdf (one merged file) or zip (one file per patient)
+
 # Token Response
 class TokenResponse(BaseModel):
     access_token: str
@@ -286,11 +390,498 @@ def serialize_docs(docs):
     """Remove MongoDB _id field from a list of documents"""
     return [serialize_doc(d) for d in docs]
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
+class TTLCache:
+    """Bounded in-process LRU cache whose entries expire after `ttl` seconds.
+    
+    A caller that loads a value asynchronously reads version(key) first and
+    passes it to set(); if the key was invalidated in between, the value may
+    predate the change and is not stored.
+    """
+    
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._epoch = 0
+        self._versions = {}
+    
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+    
+    def version(self, key):
+        return (self._epoch, self._versions.get(key, 0))
+    
+    def set(self, key, value, version=None):
+        if version is not None and version != self.version(key):
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+    
+    def invalidate(self, key):
+        self._versions[key] = self._versions.get(key, 0) + 1
+        self._data.pop(key, None)
+    
+    def clear(self):
+        self._epoch += 1
+        self._versions.clear()
+        self._data.clear()
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0
+        }
+
+class InvalidationBus:
+    """Relays cache invalidations to the other workers over Redis pub/sub.
+    
+    Each in-process cache registers a handler per message kind; publish()
+    sends the kind and its arguments to every other worker, which runs the
+    handler locally. Only active with SOCKETIO_MANAGER=redis; with a single
+    in-memory worker publish() is a no-op. Messages sent while a worker is
+    disconnected are lost, so on every (re)subscribe it drops all its caches.
+    """
+    
+    def __init__(self, url, channel):
+        self.url = url
+        self.channel = channel
+        self.origin = uuid.uuid4().hex
+        self._handlers = {}
+        self._on_resubscribe = []
+        self._redis = None
+        self._task = None
+        self._pending = set()
+        self.published = 0
+        self.received = 0
+        self.errors = 0
+    
+    def on(self, kind, handler):
+        self._handlers[kind] = handler
+    
+    def on_resubscribe(self, handler):
+        self._on_resubscribe.append(handler)
+    
+    def publish(self, kind, *args):
+        if self._redis is None:
+            return
+        message = json.dumps({"origin": self.origin, "kind": kind, "args": list(args)})
+        task = asyncio.create_task(self._publish(message))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+    
+    async def _publish(self, message):
+        try:
+            await self._redis.publish(self.channel, message)
+            self.published += 1
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Invalidation publish failed: {e}")
+    
+    def _dispatch(self, data):
+        """Apply one message; a bad message is logged and skipped"""
+        try:
+            message = json.loads(data)
+            if message.get("origin") == self.origin:
+                return
+            handler = self._handlers.get(message.get("kind"))
+            if handler:
+                handler(*message.get("args", []))
+                self.received += 1
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Invalidation message dropped: {e}")
+    
+    async def _listen(self):
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                for handler in self._on_resubscribe:
+                    handler()
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._dispatch(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Invalidation listener error: {e}")
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+    
+    def start(self):
+        if SOCKETIO_MANAGER != 'redis' or self._task is not None:
+            return
+        # Imported here so single-worker deployments don't need the package
+        import redis.asyncio as aioredis
+        self._redis = aioredis.Redis.from_url(self.url)
+        self._task = asyncio.create_task(self._listen())
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+    
+    def stats(self):
+        return {
+            "manager": SOCKETIO_MANAGER,
+            "connected": self._task is not None and not self._task.done(),
+            "published": self.published,
+            "received": self.received,
+            "errors": self.errors
+        }
+
+invalidation_bus = InvalidationBus(REDIS_URL, INVALIDATION_CHANNEL)
+
+# Resolved users keyed by (user_type, id). Routes that change or remove a
+# staff member or patient must call invalidate_principal().
+principal_cache = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+
+def invalidate_principal(user_type, user_id, broadcast=True):
+    principal_cache.invalidate((user_type, user_id))
+    if broadcast:
+        invalidation_bus.publish("principal", user_type, user_id)
+
+# Generation counter per collection, bumped by every admin write to it.
+# Conditional GET responses are cached per generation.
+cache_generations = {"units": 0, "services": 0, "doctors": 0, "document_templates": 0}
+_conditional_responses = {}
+
+def bump_generation(collection):
+    cache_generations[collection] += 1
+
+def _etag_matches(if_none_match, etag):
+    """If-None-Match uses weak comparison (RFC 7232), so W/"x" matches "x".
+    Proxies that compress the body weaken the ETag they pass on."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+async def conditional_json(request, cache_key, collection, build, cache_control="no-cache"):
+    """JSON response with a strong ETag that only changes with the collection.
+    
+    The serialized body and its ETag are kept until the collection's
+    generation is bumped, so a matching If-None-Match is answered with 304
+    without calling `build` or touching MongoDB.
+    """
+    generation = cache_generations[collection]
+    cached = _conditional_responses.get(cache_key)
+    if cached is None or cached[0] != generation:
+        body = json.dumps(jsonable_encoder(await build()), ensure_ascii=False, separators=(",", ":")).encode()
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        cached = (generation, etag, body)
+        _conditional_responses[cache_key] = cached
+    
+    headers = {"ETag": cached[1], "Cache-Control": cache_control}
+    if _etag_matches(request.headers.get("if-none-match"), cached[1]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached[2], media_type="application/json", headers=headers)
+
+class CatalogCache:
+    """In-memory copy of the reference collections (units, services, doctors).
+    
+    They change a few times a month and are read on every booking, so they
+    are kept as {id: document} maps. The admin write routes call
+    invalidate(); the next read reloads the whole collection. A load that
+    was already running when invalidate() was called returns its result
+    without storing it, since it may predate the write.
+    """
+    
+    COLLECTIONS = ("units", "services", "doctors")
+    
+    def __init__(self):
+        self.loads = 0
+        self._data = {name: None for name in self.COLLECTIONS}
+        self._versions = {name: 0 for name in self.COLLECTIONS}
+    
+    async def load(self, name):
+        version = self._versions[name]
+        docs = await db[name].find({}, {"_id": 0}).to_list(None)
+        entries = {d["id"]: d for d in docs}
+        if self._versions[name] == version:
+            self._data[name] = entries
+        self.loads += 1
+        return entries
+    
+    async def load_all(self):
+        await asyncio.gather(*(self.load(name) for name in self.COLLECTIONS))
+    
+    async def _entries(self, name):
+        entries = self._data[name]
+        if entries is None:
+            entries = await self.load(name)
+        return entries
+    
+    async def all(self, name):
+        return list((await self._entries(name)).values())
+    
+    async def get(self, name, item_id):
+        return (await self._entries(name)).get(item_id)
+    
+    def invalidate(self, name, broadcast=True):
+        self._versions[name] += 1
+        self._data[name] = None
+        bump_generation(name)
+        if broadcast:
+            invalidation_bus.publish("catalog", name)
+    
+    def stats(self):
+        return {
+            "loads": self.loads,
+            "sizes": {name: len(entries) if entries is not None else None for name, entries in self._data.items()}
+        }
+
+catalog = CatalogCache()
+
+class PasswordHasherPool:
+    """Runs bcrypt work on a bounded thread pool and tracks its queue depth.
+    
+    At most `workers` hashes run at the same time; once `max_pending` calls
+    are running or waiting, new ones are rejected with 503 instead of
+    piling up behind the pool.
+    """
+    
+    def __init__(self, workers, max_pending):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+    
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Servidor ocupado, tente novamente")
+        self.pending += 1
+        self.peak_pending = max(self.peak_pending, self.pending)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+    
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+    
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "running": min(self.pending, self.workers),
+            "queued": max(self.pending - self.workers, 0),
+            "peak_pending": self.peak_pending,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+
+password_pool = PasswordHasherPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
+
+class PdfRenderPool:
+    """Renders PDFs in worker processes, keeping ReportLab off the event loop.
+    
+    Workers are spawned (not forked) so they never inherit the Mongo client
+    or the event loop, and build their style sheets once in init_worker().
+    A semaphore caps the renders in flight; extra requests wait for a slot.
+    """
+    
+    def __init__(self, workers, max_concurrency):
+        self.workers = workers
+        self.max_concurrency = max_concurrency
+        self.rendering = 0
+        self.waiting = 0
+        self.completed = 0
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=pdf_render.init_worker
+        )
+    
+    async def run(self, fn, *args):
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.rendering += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.rendering -= 1
+            self.completed += 1
+            self._slots.release()
+    
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+    
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "max_concurrency": self.max_concurrency,
+            "rendering": self.rendering,
+            "waiting": self.waiting,
+            "completed": self.completed
+        }
+
+pdf_pool = PdfRenderPool(PDF_RENDER_WORKERS, PDF_RENDER_MAX_CONCURRENCY)
+
+class PdfCache:
+    """Content-addressed, size-bounded LRU cache of rendered PDFs on local disk.
+    
+    The key is a hash of the final document text and the layout version, so
+    a reprint of the same document is served without rendering while any
+    change to the text or layout produces a new entry. File access runs on
+    worker threads, so the index is only touched while holding _lock.
+    """
+    
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+    
+    @staticmethod
+    def key(content):
+        raw = f"{pdf_render.LAYOUT_VERSION}\n{content}".encode()
+        return hashlib.sha256(raw).hexdigest()
+    
+    def _path(self, key):
+        return self.directory / f"{key}.pdf"
+    
+    def _load(self):
+        """Index files left by previous runs, oldest access first"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        files = sorted(self.directory.glob("*.pdf"), key=lambda f: f.stat().st_mtime)
+        for f in files:
+            size = f.stat().st_size
+            self._entries[f.stem] = size
+            self._size += size
+        self._loaded = True
+        self._evict()
+    
+    def _evict(self):
+        while self._size > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            self._path(key).unlink(missing_ok=True)
+    
+    def _read(self, key):
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if key not in self._entries:
+                return None
+            path = self._path(key)
+            try:
+                data = path.read_bytes()
+                os.utime(path)
+            except FileNotFoundError:
+                self._size -= self._entries.pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return data
+    
+    def _write(self, key, data):
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if key in self._entries:
+                return
+            path = self._path(key)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            tmp.replace(path)
+            self._entries[key] = len(data)
+            self._size += len(data)
+            self._evict()
+    
+    async def get(self, key):
+        data = await asyncio.to_thread(self._read, key)
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.bytes_saved += len(data)
+        return data
+    
+    async def set(self, key, data):
+        try:
+            await asyncio.to_thread(self._write, key, data)
+        except OSError as e:
+            logger.warning(f"Could not cache PDF {key}: {e}")
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0,
+            "bytes_saved": self.bytes_saved
+        }
+
+pdf_cache = PdfCache(PDF_CACHE_DIR, PDF_CACHE_MAX_BYTES)
+
+# Document templates parsed once per version, shared by generate and generate-pdf
+template_cache = TemplateCache()
+
+async def render_pdf_cached(content):
+    """PDF bytes for a document text, rendering only on a cache miss"""
+    key = PdfCache.key(content)
+    pdf_bytes = await pdf_cache.get(key)
+    if pdf_bytes is None:
+        pdf_bytes = await pdf_pool.run(pdf_render.render_document_pdf, content)
+        await pdf_cache.set(key, pdf_bytes)
+    return pdf_bytes
+
+def content_disposition(filename):
+    """Attachment header that survives accented patient names"""
+    fallback = filename.encode("ascii", "ignore").decode() or "documento.pdf"
+    return f'attachment; filename="{fallback}"; filename*=UTF-8\'\'{quote(filename)}'
+
+async def verify_password(plain_password, hashed_password):
+    return await password_pool.run(pwd_context.verify, plain_password, hashed_password)
+
+async def get_password_hash(password):
+    return await password_pool.run(pwd_context.hash, password)
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -310,18 +901,20 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except JWTError:
         raise HTTPException(status_code=401, detail="Token inválido")
     
-    if user_type == "staff":
-        user = await db.staff.find_one({"id": user_id})
+    user_type = "staff" if user_type == "staff" else "patient"
+    cache_key = (user_type, user_id)
+    user = principal_cache.get(cache_key)
+    if user is None:
+        version = principal_cache.version(cache_key)
+        collection = db.staff if user_type == "staff" else db.users
+        user = await collection.find_one({"id": user_id})
         if user is None:
             raise HTTPException(status_code=401, detail="Usuário não encontrado")
-        user["user_type"] = "staff"
-    else:
-        user = await db.users.find_one({"id": user_id})
-        if user is None:
-            raise HTTPException(status_code=401, detail="Usuário não encontrado")
-        user["user_type"] = "patient"
+        user["user_type"] = user_type
+        principal_cache.set(cache_key, user, version)
     
-    return user
+    # Handlers get their own copy so they cannot alter the cached entry
+    return dict(user)
 
 async def get_staff_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     user = await get_current_user(credentials)
@@ -341,6 +934,148 @@ def parse_br_date(date_str):
     except Exception:
         return None
 
+def to_utc_naive(dt):
+    """Convert an aware datetime to the naive UTC form stored in MongoDB"""
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+def appointment_window(date_str, time_str, duration_minutes=0):
+    """Return (starts_at, ends_at) in UTC for a DD/MM/YYYY date and HH:MM time"""
+    apt_date = parse_br_date(date_str)
+    if not apt_date:
+        return None, None
+    try:
+        hour, minute = time_str.split(":")
+        apt_datetime = apt_date.replace(hour=int(hour), minute=int(minute))
+    except (ValueError, AttributeError):
+        return None, None
+    starts_at = to_utc_naive(apt_datetime)
+    return starts_at, starts_at + timedelta(minutes=duration_minutes or 0)
+
+def br_day_range(date_str):
+    """UTC [start, end) range covering a DD/MM/YYYY day in Brazil time"""
+    day = parse_br_date(date_str)
+    if not day:
+        return None, None
+    return to_utc_naive(day), to_utc_naive(day + timedelta(days=1))
+
+def br_month_range(year, month):
+    """UTC [start, end) range covering a calendar month in Brazil time"""
+    start = datetime(year, month, 1, tzinfo=BRT)
+    end = datetime(year + 1, 1, 1, tzinfo=BRT) if month == 12 else datetime(year, month + 1, 1, tzinfo=BRT)
+    return to_utc_naive(start), to_utc_naive(end)
+
+# ==================== PAGINATION ====================
+
+# List endpoints page with an opaque keyset cursor: the sort key values of
+# the last row returned, base64-encoded. The response body stays a plain
+# list; the cursor for the next page and the optional total are sent in the
+# X-Next-Cursor and X-Total-Count headers.
+
+def encode_cursor(values):
+    """Encode the sort key values of the last row as an opaque cursor"""
+    payload = [{"d": v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor, size):
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = [
+            datetime.fromisoformat(v["d"]) if isinstance(v, dict) else v
+            for v in json.loads(raw)
+        ]
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if len(values) != size:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return values
+
+def _keyset_filter(sort, values):
+    """Match rows strictly after `values` in `sort` order"""
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {f: values[j] for j, (f, _) in enumerate(sort[:i])}
+        clause[field] = {"$gt" if direction == ASCENDING else "$lt": values[i]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+async def paginate(collection, query, sort, response, limit, cursor=None, include_total=False):
+    """Fetch one page of `query` in `sort` order.
+    
+    The last sort field must be unique (normally "id") so that every row has
+    a distinct position. Sets X-Next-Cursor (and X-Total-Count when asked)
+    on the response and returns the page of documents.
+    """
+    page_query = query
+    if cursor:
+        page_query = {"$and": [query, _keyset_filter(sort, decode_cursor(cursor, len(sort)))]}
+    
+    find = collection.find(page_query).sort(sort).limit(limit + 1).to_list(limit + 1)
+    if include_total:
+        count = collection.count_documents(query) if query else collection.estimated_document_count()
+        docs, total = await asyncio.gather(find, count)
+        response.headers["X-Total-Count"] = str(total)
+    else:
+        docs = await find
+    
+    if len(docs) > limit:
+        docs = docs[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor([docs[-1].get(f) for f, _ in sort])
+    return docs
+
+# ==================== DOCTOR PHOTOS ====================
+
+# Doctor photos are resized once on upload into square JPEG thumbnails and
+# stored in GridFS; doctor documents only carry the photo hash and URL.
+DOCTOR_PHOTO_SIZES = {"sm": 96, "md": 256, "lg": 512}
+photo_bucket = AsyncIOMotorGridFSBucket(db, bucket_name="doctor_photos")
+photo_bytes_cache = TTLCache(256, 3600)
+
+def _make_photo_thumbnails(raw):
+    """Decode an uploaded photo and render one square JPEG per size"""
+    image = ImageOps.exif_transpose(Image.open(BytesIO(raw))).convert("RGB")
+    thumbnails = {}
+    for size_name, pixels in DOCTOR_PHOTO_SIZES.items():
+        thumb = ImageOps.fit(image, (pixels, pixels), Image.Resampling.LANCZOS)
+        out = BytesIO()
+        thumb.save(out, "JPEG", quality=85, optimize=True, progressive=True)
+        thumbnails[size_name] = out.getvalue()
+    return thumbnails
+
+def _photo_filename(doctor_id, photo_hash, size_name):
+    return f"{doctor_id}/{photo_hash}/{size_name}.jpg"
+
+async def store_doctor_photo(doctor_id, photo_base64):
+    """Store the thumbnails of an uploaded photo and return the doctor fields pointing at them"""
+    if photo_base64.startswith("data:") and "," in photo_base64:
+        photo_base64 = photo_base64.split(",", 1)[1]
+    try:
+        raw = base64.b64decode(photo_base64)
+        thumbnails = await asyncio.get_running_loop().run_in_executor(None, _make_photo_thumbnails, raw)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Foto inválida")
+    
+    photo_hash = hashlib.sha256(raw).hexdigest()[:16]
+    for size_name, data in thumbnails.items():
+        filename = _photo_filename(doctor_id, photo_hash, size_name)
+        if await db["doctor_photos.files"].find_one({"filename": filename}, {"_id": 1}):
+            continue
+        await photo_bucket.upload_from_stream(
+            filename, data,
+            metadata={"doctor_id": doctor_id, "hash": photo_hash, "size": size_name, "content_type": "image/jpeg"}
+        )
+    await delete_doctor_photos(doctor_id, keep_hash=photo_hash)
+    
+    return {"photo_hash": photo_hash, "photo_url": f"/api/doctors/{doctor_id}/photo?v={photo_hash}"}
+
+async def delete_doctor_photos(doctor_id, keep_hash=None):
+    """Remove a doctor's stored thumbnails, except those of `keep_hash`"""
+    query = {"metadata.doctor_id": doctor_id}
+    if keep_hash:
+        query["metadata.hash"] = {"$ne": keep_hash}
+    async for grid_file in photo_bucket.find(query):
+        await photo_bucket.delete(grid_file._id)
+
 # ==================== SOCKET.IO EVENTS ====================
 
 @sio.event
@@ -379,6 +1114,753 @@ async def emit_to_patient(user_id, event, data):
     except Exception as e:
         logger.error(f"Error emitting to patient: {e}")
 
+# ==================== REMINDERS ====================
+
+class ReminderScheduler:
+    """Pushes appointment_reminder events at fixed lead times before each appointment.
+    
+    Upcoming reminders sit in a heap ordered by fire time, loaded with one
+    range query on (status, starts_at) and refreshed every refresh_seconds,
+    and updated directly by the appointment routes. Sending claims the
+    reminder with $addToSet on reminders_sent, so a restart or a second
+    worker never sends the same reminder twice.
+    """
+    
+    def __init__(self, lead_minutes, refresh_seconds, grace_seconds):
+        self.lead_minutes = lead_minutes
+        self.refresh_seconds = refresh_seconds
+        self.grace = timedelta(seconds=grace_seconds)
+        self.horizon = timedelta(minutes=max(lead_minutes, default=0), seconds=2 * refresh_seconds)
+        self._heap = []
+        self._scheduled = {}  # appointment id -> starts_at its reminders were queued for
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.sent = 0
+        self.skipped = 0
+    
+    def schedule(self, apt, now=None):
+        """Queue the reminders of an active appointment starting within the horizon"""
+        starts_at = apt.get("starts_at")
+        if not starts_at or apt.get("status") != "agendado":
+            return
+        now = now or datetime.utcnow()
+        if starts_at <= now or starts_at > now + self.horizon or self._scheduled.get(apt["id"]) == starts_at:
+            return
+        self._scheduled[apt["id"]] = starts_at
+        sent = set(apt.get("reminders_sent") or [])
+        for lead in self.lead_minutes:
+            fire_at = starts_at - timedelta(minutes=lead)
+            if lead not in sent and fire_at >= now - self.grace:
+                heapq.heappush(self._heap, (fire_at, apt["id"], lead, starts_at))
+        if self._heap and self._heap[0][1] == apt["id"]:
+            self._wakeup.set()
+    
+    def unschedule(self, appointment_id):
+        """Drop an appointment's reminders; its heap entries are skipped when due"""
+        self._scheduled.pop(appointment_id, None)
+    
+    async def load(self):
+        now = datetime.utcnow()
+        for apt_id, starts_at in list(self._scheduled.items()):
+            if starts_at <= now:
+                del self._scheduled[apt_id]
+        async for apt in db.appointments.find(
+            {"status": "agendado", "starts_at": {"$gt": now, "$lte": now + self.horizon}},
+            {"_id": 0, "id": 1, "status": 1, "starts_at": 1, "reminders_sent": 1}
+        ):
+            self.schedule(apt, now)
+    
+    async def _send(self, apt_id, lead, starts_at):
+        apt = await db.appointments.find_one_and_update(
+            {"id": apt_id, "status": "agendado", "starts_at": starts_at, "reminders_sent": {"$ne": lead}},
+            {"$addToSet": {"reminders_sent": lead}},
+            projection={"_id": 0, "id": 1, "user_id": 1, "date": 1, "time": 1, "doctor_name": 1, "service_name": 1, "unit_name": 1}
+        )
+        if not apt:
+            return
+        await emit_to_patient(apt["user_id"], 'appointment_reminder', {
+            "id": apt["id"],
+            "date": apt.get("date", ""),
+            "time": apt.get("time", ""),
+            "doctor_name": apt.get("doctor_name", ""),
+            "service_name": apt.get("service_name", ""),
+            "unit_name": apt.get("unit_name", ""),
+            "lead_minutes": lead,
+        })
+        self.sent += 1
+    
+    async def _fire_due(self):
+        now = datetime.utcnow()
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, apt_id, lead, starts_at = heapq.heappop(self._heap)
+            if self._scheduled.get(apt_id) != starts_at:
+                continue
+            if fire_at < now - self.grace:
+                self.skipped += 1
+                continue
+            await self._send(apt_id, lead, starts_at)
+    
+    async def _run(self):
+        next_refresh = 0
+        while True:
+            try:
+                if time.monotonic() >= next_refresh:
+                    await self.load()
+                    next_refresh = time.monotonic() + self.refresh_seconds
+                await self._fire_due()
+                timeout = next_refresh - time.monotonic()
+                if self._heap:
+                    timeout = min(timeout, (self._heap[0][0] - datetime.utcnow()).total_seconds())
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0))
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Reminder scheduler error: {e}")
+                await asyncio.sleep(5)
+    
+    def start(self):
+        if self.lead_minutes and self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    def stats(self):
+        return {
+            "lead_minutes": self.lead_minutes,
+            "queued": len(self._heap),
+            "appointments": len(self._scheduled),
+            "sent": self.sent,
+            "skipped": self.skipped
+        }
+
+reminder_scheduler = ReminderScheduler(REMINDER_LEAD_MINUTES, REMINDER_REFRESH_SECONDS, REMINDER_GRACE_SECONDS)
+
+# ==================== SLOT BITMAPS ====================
+
+def slot_mask(time_str, duration_minutes):
+    """Bits of the 15-minute slots covered by [time, time + duration)"""
+    hour, minute = time_str.split(":")
+    start = int(hour) * 60 + int(minute)
+    first = start // SLOT_MINUTES
+    last = -(-(start + max(duration_minutes or 0, 1)) // SLOT_MINUTES)
+    return ((1 << (last - first)) - 1) << first
+
+def appointment_mask(apt):
+    """Bits an appointment occupies on its day, from its time and duration"""
+    duration = 0
+    if apt.get("starts_at") and apt.get("ends_at"):
+        duration = int((apt["ends_at"] - apt["starts_at"]).total_seconds() // 60)
+    try:
+        return slot_mask(apt["time"], duration)
+    except (KeyError, ValueError, AttributeError):
+        return 0
+
+def bitmap_intervals(bits):
+    """Contiguous runs of set bits as ("HH:MM", "HH:MM") start/end pairs"""
+    intervals = []
+    slot = 0
+    while bits:
+        if bits & 1:
+            start = slot
+            while bits & 1:
+                bits >>= 1
+                slot += 1
+            intervals.append(tuple(
+                f"{m // 60:02d}:{m % 60:02d}" for m in (start * SLOT_MINUTES, slot * SLOT_MINUTES)
+            ))
+        else:
+            bits >>= 1
+            slot += 1
+    return intervals
+
+def slot_day_in_window(date_str):
+    """Whether a DD/MM/YYYY day is within the range slot bitmaps are cached for"""
+    day = parse_br_date(date_str)
+    if not day:
+        return False
+    today = datetime.now(BRT).date()
+    return today - timedelta(days=1) <= day.date() <= today + timedelta(days=SLOT_BITMAP_HORIZON_DAYS)
+
+@lru_cache(maxsize=64)
+def candidate_masks(duration_minutes):
+    """(time, start minute, mask) for every bookable start time"""
+    result = []
+    for time_str in APPOINTMENT_TIMES:
+        hour, minute = time_str.split(":")
+        result.append((time_str, int(hour) * 60 + int(minute), slot_mask(time_str, duration_minutes)))
+    return tuple(result)
+
+class SlotBitmaps:
+    """Per-doctor, per-day occupancy bitmaps of active appointments.
+    
+    Days are loaded lazily, many at once with a single query, and kept up
+    to date by the appointment routes. Releasing a slot drops the day so it
+    is reloaded, since overlapping appointments can share bits. Past
+    max_days the least recently loaded days are evicted.
+    """
+    
+    def __init__(self, ttl, max_days):
+        self.ttl = ttl
+        self.max_days = max_days
+        self._days = OrderedDict()
+        self.loads = 0
+        self.lookups = 0
+    
+    def _fresh(self, key, now):
+        entry = self._days.get(key)
+        return entry is not None and now - entry[1] < self.ttl
+    
+    def fill(self, days):
+        """Store bitmaps built from {(doctor_id, date): [appointments]}"""
+        now = time.monotonic()
+        if len(self._days) + len(days) > self.max_days:
+            self._days = OrderedDict((k, v) for k, v in self._days.items() if now - v[1] < self.ttl)
+        for key, appointments in days.items():
+            bits = 0
+            for apt in appointments:
+                bits |= appointment_mask(apt)
+            self._days[key] = (bits, now)
+            self._days.move_to_end(key)
+        while len(self._days) > self.max_days:
+            self._days.popitem(last=False)
+    
+    async def _appointments(self, keys):
+        """Active appointments of each (doctor_id, date) key"""
+        found = {key: [] for key in keys}
+        async for apt in db.appointments.find(
+            {
+                "doctor_id": {"$in": list({d for d, _ in found})},
+                "date": {"$in": list({day for _, day in found})},
+                "status": {"$ne": "cancelado"}
+            },
+            {"_id": 0, "doctor_id": 1, "date": 1, "time": 1, "starts_at": 1, "ends_at": 1}
+        ):
+            key = (apt["doctor_id"], apt["date"])
+            if key in found:
+                found[key].append(apt)
+        return found
+    
+    async def ensure(self, doctor_ids, dates):
+        """Load every (doctor, date) bitmap that is missing or expired.
+        
+        Only catalog doctors and days inside the bitmap window are cached, so
+        ids and dates sent to the public routes cannot grow memory.
+        """
+        now = time.monotonic()
+        doctor_ids = [d for d in set(doctor_ids) if await catalog.get("doctors", d)]
+        dates = [day for day in set(dates) if slot_day_in_window(day)]
+        missing = [(d, day) for d in doctor_ids for day in dates if not self._fresh((d, day), now)]
+        if not missing:
+            return
+        self.fill(await self._appointments(missing))
+        self.loads += 1
+    
+    def has(self, doctor_id, date_str):
+        return self._fresh((doctor_id, date_str), time.monotonic())
+    
+    async def fetch(self, doctor_id, date_str):
+        """Bits of one day read from the database without caching them"""
+        bits = 0
+        for apt in (await self._appointments([(doctor_id, date_str)]))[(doctor_id, date_str)]:
+            bits |= appointment_mask(apt)
+        return bits
+    
+    def bits(self, doctor_id, date_str):
+        self.lookups += 1
+        return self._days.get((doctor_id, date_str), (0, 0))[0]
+    
+    def free_times(self, doctor_id, date_str, duration_minutes, after_minute=-1):
+        """Start times whose slots are all free, starting after after_minute"""
+        bits = self.bits(doctor_id, date_str)
+        return [
+            time_str for time_str, start, mask in candidate_masks(duration_minutes)
+            if start > after_minute and not bits & mask
+        ]
+    
+    def occupy(self, apt):
+        key = (apt.get("doctor_id"), apt.get("date"))
+        entry = self._days.get(key)
+        if entry is not None:
+            self._days[key] = (entry[0] | appointment_mask(apt), entry[1])
+        invalidation_bus.publish("slot_day", *key)
+    
+    def release(self, apt):
+        self.drop_day(apt.get("doctor_id"), apt.get("date"))
+        invalidation_bus.publish("slot_day", apt.get("doctor_id"), apt.get("date"))
+    
+    def drop_day(self, doctor_id, date_str):
+        self._days.pop((doctor_id, date_str), None)
+    
+    def clear(self):
+        self._days.clear()
+    
+    def stats(self):
+        return {"days": len(self._days), "loads": self.loads, "lookups": self.lookups}
+
+slot_bitmaps = SlotBitmaps(SLOT_BITMAP_TTL, SLOT_BITMAP_MAX_DAYS)
+
+# ==================== INDEXES ====================
+
+# Declared indexes per collection. ensure_indexes() reconciles the database
+# against this list on every startup, so adding an entry here is all that is
+# needed to ship a new index.
+INDEX_SPECS = {
+    "appointments": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("doctor_id", ASCENDING), ("date", ASCENDING), ("time", ASCENDING), ("status", ASCENDING)], name="doctor_date_time_status"),
+        # Active appointments carry slot_claimed: True; cancelling unsets it
+        IndexModel(
+            [("doctor_id", ASCENDING), ("date", ASCENDING), ("time", ASCENDING)],
+            name="doctor_slot_unique", unique=True,
+            partialFilterExpression={"slot_claimed": True}
+        ),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="user_created_at"),
+        IndexModel([("status", ASCENDING), ("starts_at", DESCENDING), ("id", DESCENDING)], name="status_starts_at"),
+        IndexModel([("status", ASCENDING), ("unit_id", ASCENDING), ("starts_at", ASCENDING)], name="status_unit_starts_at"),
+        IndexModel([("user_id", ASCENDING), ("starts_at", ASCENDING)], name="user_starts_at"),
+        IndexModel([("starts_at", DESCENDING), ("id", DESCENDING)], name="starts_at"),
+        IndexModel([("doctor_id", ASCENDING), ("starts_at", DESCENDING), ("id", DESCENDING)], name="doctor_starts_at"),
+        IndexModel([("doctor_id", ASCENDING), ("ends_at", ASCENDING), ("starts_at", ASCENDING)], name="doctor_ends_at"),
+        IndexModel([("unit_id", ASCENDING), ("starts_at", DESCENDING), ("id", DESCENDING)], name="unit_starts_at"),
+    ],
+    "users": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("cpf", ASCENDING)], name="cpf"),
+        IndexModel([("name", ASCENDING), ("id", ASCENDING)], name="name_id"),
+    ],
+    "staff": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email"),
+    ],
+    "units": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "services": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "doctors": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("unit_id", ASCENDING)], name="unit_id"),
+    ],
+    "inventory": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("low_stock", ASCENDING), ("name", ASCENDING)], name="low_stock_name",
+                   partialFilterExpression={"low_stock": True}),
+    ],
+    "inventory_movements": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("item_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="item_created_at"),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at"),
+    ],
+    "document_templates": [
+        IndexModel([("type", ASCENDING)], name="type"),
+    ],
+    "financial_rollups": [
+        IndexModel([("day", ASCENDING), ("unit_id", ASCENDING), ("doctor_id", ASCENDING), ("service_id", ASCENDING)], name="day_unit_doctor_service", unique=True),
+        IndexModel([("unit_id", ASCENDING), ("day", ASCENDING)], name="unit_day"),
+    ],
+}
+
+# Queries issued by the hot request paths, used by explain_hot_queries() to
+# check that every one of them is served by an index.
+HOT_QUERIES = [
+    ("reserve_appointment: overlap", "appointments",
+     {"doctor_id": "doctor-1", "ends_at": {"$gt": datetime(2025, 1, 1, 12)},
+      "starts_at": {"$lt": datetime(2025, 1, 1, 13)}, "status": {"$ne": "cancelado"}}, None),
+    ("slot_bitmaps: load days", "appointments",
+     {"doctor_id": {"$in": ["doctor-1", "doctor-2"]}, "date": {"$in": ["01/01/2025", "02/01/2025"]}, "status": {"$ne": "cancelado"}}, None),
+    ("get_appointments", "appointments", {"user_id": "user-1"}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("get_all_appointments", "appointments", {}, [("starts_at", DESCENDING), ("id", DESCENDING)]),
+    ("get_all_appointments: by day", "appointments",
+     {"starts_at": {"$gte": datetime(2025, 1, 1, 3), "$lt": datetime(2025, 1, 2, 3)}}, [("starts_at", DESCENDING), ("id", DESCENDING)]),
+    ("get_all_appointments: by status", "appointments", {"status": "agendado"}, [("starts_at", DESCENDING), ("id", DESCENDING)]),
+    ("get_all_appointments: by doctor", "appointments", {"doctor_id": "doctor-1"}, [("starts_at", DESCENDING), ("id", DESCENDING)]),
+    ("get_all_appointments: by unit", "appointments", {"unit_id": "unit-1"}, [("starts_at", DESCENDING), ("id", DESCENDING)]),
+    ("get_all_patients", "users", {}, [("name", ASCENDING), ("id", ASCENDING)]),
+    ("get_low_stock", "inventory", {"low_stock": True}, [("name", ASCENDING)]),
+    ("get_upcoming_reminders", "appointments",
+     {"user_id": "user-1", "status": "agendado", "starts_at": {"$gt": datetime(2025, 1, 1), "$lte": datetime(2025, 1, 2)}}, None),
+    ("get_financial_summary", "appointments",
+     {"status": "concluido", "starts_at": {"$gte": datetime(2025, 1, 1, 3), "$lt": datetime(2025, 2, 1, 3)}}, None),
+    ("get_financial_summary: by unit", "appointments",
+     {"status": "concluido", "unit_id": "unit-1", "starts_at": {"$gte": datetime(2025, 1, 1, 3), "$lt": datetime(2025, 2, 1, 3)}}, None),
+    ("get_daily_financial", "appointments",
+     {"status": "concluido", "starts_at": {"$gte": datetime(2025, 1, 1, 3), "$lt": datetime(2025, 1, 2, 3)}}, None),
+    ("update_appointment", "appointments", {"id": "apt-1"}, None),
+    ("login", "users", {"cpf": "000.000.000-00", "birth_date": "01/01/1990"}, None),
+    ("get_current_user: patient", "users", {"id": "user-1"}, None),
+    ("get_current_user: staff", "staff", {"id": "staff-1"}, None),
+    ("staff_login", "staff", {"email": "admin@odonto.com"}, None),
+    ("update_unit", "units", {"id": "unit-1"}, None),
+    ("update_service", "services", {"id": "service-1"}, None),
+    ("update_doctor", "doctors", {"id": "doctor-1"}, None),
+    ("add_inventory_movement", "inventory", {"id": "item-1"}, None),
+    ("get_inventory_movements", "inventory_movements", {}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("get_inventory_movements: by item", "inventory_movements", {"item_id": "item-1"}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("get_document_template", "document_templates", {"type": "atestado"}, None),
+    ("get_financial_summary: rollups", "financial_rollups", {"day": {"$gte": "2025-01-01", "$lt": "2025-02-01"}}, None),
+    ("get_financial_summary: rollups by unit", "financial_rollups",
+     {"unit_id": "unit-1", "day": {"$gte": "2025-01-01", "$lt": "2025-02-01"}}, None),
+]
+
+def _index_matches(existing, model_doc):
+    """Compare an index_information() entry with a declared IndexModel document"""
+    existing_key = [(field, int(direction)) for field, direction in existing["key"]]
+    declared_key = [(field, int(direction)) for field, direction in model_doc["key"].items()]
+    return (
+        existing_key == declared_key
+        and bool(existing.get("unique", False)) == bool(model_doc.get("unique", False))
+        and existing.get("partialFilterExpression") == model_doc.get("partialFilterExpression")
+    )
+
+async def ensure_indexes():
+    """Create missing indexes and rebuild the ones whose definition changed"""
+    report = {}
+    for collection_name, models in INDEX_SPECS.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+        result = {"created": [], "rebuilt": [], "unchanged": [], "failed": []}
+        for model in models:
+            model_doc = model.document
+            name = model_doc["name"]
+            try:
+                if name in existing:
+                    if _index_matches(existing[name], model_doc):
+                        result["unchanged"].append(name)
+                        continue
+                    await collection.drop_index(name)
+                    await collection.create_indexes([model])
+                    result["rebuilt"].append(name)
+                else:
+                    await collection.create_indexes([model])
+                    result["created"].append(name)
+            except OperationFailure as e:
+                logger.error(f"Could not create index {collection_name}.{name}: {e}")
+                result["failed"].append(name)
+        
+        declared = {m.document["name"] for m in models}
+        unmanaged = [name for name in existing if name != "_id_" and name not in declared]
+        if unmanaged:
+            logger.info(f"Unmanaged indexes on {collection_name}: {unmanaged}")
+        
+        if result["created"] or result["rebuilt"]:
+            logger.info(f"Indexes on {collection_name}: created {result['created']}, rebuilt {result['rebuilt']}")
+        report[collection_name] = result
+    return report
+
+def _plan_stages(plan):
+    """Collect every stage name found in an explain() plan tree"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
+async def explain_hot_queries():
+    """Run explain() for every hot query and report the winning plan stages"""
+    results = []
+    for label, collection_name, query, sort in HOT_QUERIES:
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.limit(1).explain()
+        planner = explain.get("queryPlanner", {})
+        stages = _plan_stages(planner.get("winningPlan", {}))
+        results.append({
+            "query": label,
+            "collection": collection_name,
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+        })
+    return results
+
+# ==================== MIGRATIONS ====================
+
+async def backfill_appointment_windows(batch_size=500):
+    """Write starts_at/ends_at on appointments created before those fields existed.
+    
+    The run is recorded in the migrations collection so startup does it
+    only once; manage.py reruns it on demand.
+    """
+    durations = {}
+    async for service in db.services.find({}, {"id": 1, "duration_minutes": 1}):
+        durations[service["id"]] = service.get("duration_minutes", 0)
+    
+    cursor = db.appointments.find(
+        {"starts_at": {"$exists": False}},
+        {"_id": 1, "date": 1, "time": 1, "service_id": 1}
+    ).batch_size(batch_size)
+    
+    updated = 0
+    skipped = 0
+    ops = []
+    async for apt in cursor:
+        starts_at, ends_at = appointment_window(apt.get("date", ""), apt.get("time", ""), durations.get(apt.get("service_id"), 0))
+        if starts_at is None:
+            skipped += 1
+            continue
+        ops.append(UpdateOne({"_id": apt["_id"]}, {"$set": {"starts_at": starts_at, "ends_at": ends_at}}))
+        if len(ops) >= batch_size:
+            await db.appointments.bulk_write(ops, ordered=False)
+            updated += len(ops)
+            ops = []
+    if ops:
+        await db.appointments.bulk_write(ops, ordered=False)
+        updated += len(ops)
+    
+    if updated or skipped:
+        logger.info(f"Backfilled starts_at on {updated} appointments ({skipped} with unparseable date/time)")
+    await db.migrations.update_one(
+        {"_id": "backfill_appointment_windows"},
+        {"$set": {"completed_at": datetime.utcnow(), "updated": updated, "skipped": skipped}},
+        upsert=True
+    )
+    return {"updated": updated, "skipped": skipped}
+
+async def ensure_appointment_windows():
+    """Run backfill_appointment_windows on the first start after starts_at was introduced"""
+    if await db.migrations.find_one({"_id": "backfill_appointment_windows"}, {"_id": 1}):
+        return
+    await backfill_appointment_windows()
+
+async def claim_appointment_slots(batch_size=500):
+    """Set slot_claimed on active appointments created before the flag existed.
+    
+    Oldest bookings claim first; when legacy data already holds a double
+    booking, the later appointment is left unclaimed and reported. The run
+    is recorded in the migrations collection so startup does it only once;
+    after resolving reported conflicts, rerun it with manage.py.
+    """
+    cursor = db.appointments.find(
+        {"status": {"$ne": "cancelado"}, "slot_claimed": {"$exists": False}},
+        {"_id": 1}
+    ).sort("created_at", ASCENDING).batch_size(batch_size)
+    
+    claimed = 0
+    conflicts = 0
+    
+    async def flush(ops):
+        nonlocal claimed, conflicts
+        try:
+            result = await db.appointments.bulk_write(ops, ordered=False)
+            claimed += result.modified_count
+        except BulkWriteError as e:
+            duplicates = sum(1 for err in e.details["writeErrors"] if err["code"] == 11000)
+            if duplicates != len(e.details["writeErrors"]):
+                raise
+            claimed += e.details["nModified"]
+            conflicts += duplicates
+    
+    ops = []
+    async for apt in cursor:
+        ops.append(UpdateOne({"_id": apt["_id"]}, {"$set": {"slot_claimed": True}}))
+        if len(ops) >= batch_size:
+            await flush(ops)
+            ops = []
+    if ops:
+        await flush(ops)
+    
+    await db.migrations.update_one(
+        {"_id": "claim_appointment_slots"},
+        {"$set": {"completed_at": datetime.utcnow(), "claimed": claimed, "conflicts": conflicts}},
+        upsert=True
+    )
+    if claimed or conflicts:
+        logger.info(f"Claimed slots for {claimed} appointments ({conflicts} double bookings left unclaimed)")
+    return {"claimed": claimed, "conflicts": conflicts}
+
+async def ensure_appointment_slots_claimed():
+    """Run claim_appointment_slots on the first start after slot_claimed was introduced"""
+    if await db.migrations.find_one({"_id": "claim_appointment_slots"}, {"_id": 1}):
+        return
+    await claim_appointment_slots()
+
+async def ensure_low_stock_flags():
+    """Compute low_stock on inventory items saved before the flag existed"""
+    result = await db.inventory.update_many(
+        {"low_stock": {"$exists": False}},
+        [{"$set": {"low_stock": LOW_STOCK_EXPR}}]
+    )
+    if result.modified_count:
+        logger.info(f"Set low_stock on {result.modified_count} inventory items")
+    return {"updated": result.modified_count}
+
+async def flush_inventory_outbox():
+    """Write ledger entries left in inventory.pending_movements by an interrupted request"""
+    flushed = 0
+    async for item in db.inventory.find({"pending_movements.0": {"$exists": True}}, {"id": 1, "name": 1, "pending_movements": 1}):
+        for movement in item["pending_movements"]:
+            await record_inventory_movement(item["id"], {**movement, "item_name": item.get("name", "")})
+            flushed += 1
+    if flushed:
+        logger.info(f"Flushed {flushed} pending inventory movements")
+    return {"flushed": flushed}
+
+async def migrate_doctor_photos():
+    """Move photos stored inline as photo_base64 into GridFS thumbnails"""
+    migrated = 0
+    failed = 0
+    async for doctor in db.doctors.find({"photo_base64": {"$nin": [None, ""]}}, {"id": 1, "photo_base64": 1}):
+        try:
+            fields = await store_doctor_photo(doctor["id"], doctor["photo_base64"])
+        except HTTPException:
+            logger.warning(f"Could not migrate photo of doctor {doctor['id']}")
+            failed += 1
+            continue
+        await db.doctors.update_one({"id": doctor["id"]}, {"$set": fields, "$unset": {"photo_base64": ""}})
+        migrated += 1
+    
+    if migrated:
+        catalog.invalidate("doctors")
+        logger.info(f"Migrated {migrated} doctor photos to GridFS")
+    return {"migrated": migrated, "failed": failed}
+
+# ==================== FINANCIAL ROLLUPS ====================
+
+# Revenue of completed appointments, pre-aggregated per day (YYYY-MM-DD in
+# Brazil time) x unit x doctor x service. Kept up to date with $inc by every
+# write that moves an appointment into or out of "concluido".
+
+ROLLUP_KEY_FIELDS = ("day", "unit_id", "doctor_id", "service_id")
+
+def rollup_day(date_str):
+    """Convert DD/MM/YYYY to the YYYY-MM-DD key used by financial_rollups"""
+    day = parse_br_date(date_str)
+    return day.strftime("%Y-%m-%d") if day else None
+
+def _rollup_contribution(apt):
+    """Return (key, revenue) an appointment adds to the rollups, or None"""
+    if not apt or apt.get("status") != "concluido":
+        return None
+    day = rollup_day(apt.get("date", ""))
+    if not day:
+        return None
+    key = (day, apt.get("unit_id", ""), apt.get("doctor_id", ""), apt.get("service_id", ""))
+    return key, apt.get("paid_value") or 0
+
+async def apply_rollup_delta(before, after):
+    """Move an appointment's contribution from its old state to its new state"""
+    deltas = {}
+    old = _rollup_contribution(before)
+    new = _rollup_contribution(after)
+    if old:
+        revenue, count = deltas.get(old[0], (0, 0))
+        deltas[old[0]] = (revenue - old[1], count - 1)
+    if new:
+        revenue, count = deltas.get(new[0], (0, 0))
+        deltas[new[0]] = (revenue + new[1], count + 1)
+    
+    ops = []
+    for key, (revenue, count) in deltas.items():
+        if revenue == 0 and count == 0:
+            continue
+        ops.append(UpdateOne(
+            dict(zip(ROLLUP_KEY_FIELDS, key)),
+            {
+                "$inc": {"revenue": revenue, "appointments": count},
+                "$set": {
+                    "unit_name": after.get("unit_name", ""),
+                    "doctor_name": after.get("doctor_name", ""),
+                    "service_name": after.get("service_name", ""),
+                }
+            },
+            upsert=True
+        ))
+    if ops:
+        await db.financial_rollups.bulk_write(ops, ordered=False)
+
+def _rollup_pipeline():
+    """Aggregation that computes financial_rollups from raw appointments"""
+    return [
+        {"$match": {"status": "concluido", "date": {"$regex": r"^\d{2}/\d{2}/\d{4}$"}}},
+        {"$group": {
+            "_id": {
+                "day": {"$concat": [
+                    {"$substrCP": ["$date", 6, 4]}, "-",
+                    {"$substrCP": ["$date", 3, 2]}, "-",
+                    {"$substrCP": ["$date", 0, 2]}
+                ]},
+                "unit_id": {"$ifNull": ["$unit_id", ""]},
+                "doctor_id": {"$ifNull": ["$doctor_id", ""]},
+                "service_id": {"$ifNull": ["$service_id", ""]},
+            },
+            "revenue": {"$sum": {"$ifNull": ["$paid_value", 0]}},
+            "appointments": {"$sum": 1},
+            "unit_name": {"$last": "$unit_name"},
+            "doctor_name": {"$last": "$doctor_name"},
+            "service_name": {"$last": "$service_name"},
+        }},
+        {"$project": {
+            "_id": 0,
+            "day": "$_id.day",
+            "unit_id": "$_id.unit_id",
+            "doctor_id": "$_id.doctor_id",
+            "service_id": "$_id.service_id",
+            "revenue": 1,
+            "appointments": 1,
+            "unit_name": 1,
+            "doctor_name": 1,
+            "service_name": 1,
+        }},
+    ]
+
+async def rebuild_financial_rollups():
+    """Recompute financial_rollups from scratch, replacing the collection"""
+    await db.appointments.aggregate(_rollup_pipeline() + [{"$out": "financial_rollups"}]).to_list(None)
+    count = await db.financial_rollups.count_documents({})
+    logger.info(f"Rebuilt financial_rollups: {count} documents")
+    return count
+
+async def ensure_financial_rollups():
+    """Build financial_rollups on first start after the collection was introduced"""
+    if await db.financial_rollups.estimated_document_count() > 0:
+        return
+    if await db.appointments.find_one({"status": "concluido"}, {"_id": 1}):
+        await rebuild_financial_rollups()
+
+async def verify_financial_rollups():
+    """Compare financial_rollups with totals computed from raw appointments"""
+    expected = {}
+    async for row in db.appointments.aggregate(_rollup_pipeline()):
+        expected[tuple(row[f] for f in ROLLUP_KEY_FIELDS)] = (row["revenue"], row["appointments"])
+    
+    actual = {}
+    async for row in db.financial_rollups.find({}, {"_id": 0}):
+        # Rows drained to zero by cancellations are equivalent to missing rows
+        if row.get("appointments", 0) == 0 and not row.get("revenue"):
+            continue
+        actual[tuple(row.get(f) for f in ROLLUP_KEY_FIELDS)] = (row.get("revenue", 0), row.get("appointments", 0))
+    
+    mismatches = []
+    for key in sorted(set(expected) | set(actual)):
+        exp = expected.get(key, (0, 0))
+        act = actual.get(key, (0, 0))
+        if abs(exp[0] - act[0]) > 0.005 or exp[1] != act[1]:
+            mismatches.append({
+                **dict(zip(ROLLUP_KEY_FIELDS, key)),
+                "expected_revenue": exp[0],
+                "actual_revenue": act[0],
+                "expected_appointments": exp[1],
+                "actual_appointments": act[1],
+            })
+    return {"checked": len(expected), "mismatches": mismatches}
+
 # ==================== SEED DATA ====================
 
 DEFAULT_DOCUMENT_TEMPLATES = {
@@ -481,10 +1963,10 @@ async def seed_data():
     
     # Doctors with CRO
     doctors = [
-        {"id": "doctor-1", "name": "Dr. Carlos Silva", "specialty": "Clínico Geral", "unit_id": "unit-1", "cro": "AM-12345", "phone": "(92) 99999-1111", "email": "carlos@odonto.com", "photo_base64": None, "bio": "10 anos de experiência em odontologia geral", "available_days": ["Segunda", "Terça", "Quarta", "Quinta", "Sexta"]},
-        {"id": "doctor-2", "name": "Dra. Ana Santos", "specialty": "Ortodontista", "unit_id": "unit-1", "cro": "AM-12346", "phone": "(92) 99999-2222", "email": "ana@odonto.com", "photo_base64": None, "bio": "Especialista em aparelhos ortodônticos", "available_days": ["Segunda", "Quarta", "Sexta"]},
-        {"id": "doctor-3", "name": "Dr. Pedro Oliveira", "specialty": "Endodontista", "unit_id": "unit-2", "cro": "AM-12347", "phone": "(92) 99999-3333", "email": "pedro@odonto.com", "photo_base64": None, "bio": "Especialista em tratamento de canal", "available_days": ["Terça", "Quinta", "Sexta"]},
-        {"id": "doctor-4", "name": "Dra. Maria Costa", "specialty": "Clínico Geral", "unit_id": "unit-2", "cro": "AM-12348", "phone": "(92) 99999-4444", "email": "maria@odonto.com", "photo_base64": None, "bio": "8 anos de experiência em procedimentos estéticos", "available_days": ["Segunda", "Terça", "Quarta", "Quinta"]}
+        {"id": "doctor-1", "name": "Dr. Carlos Silva", "specialty": "Clínico Geral", "unit_id": "unit-1", "cro": "AM-12345", "phone": "(92) 99999-1111", "email": "carlos@odonto.com", "photo_hash": None, "photo_url": None, "bio": "10 anos de experiência em odontologia geral", "available_days": ["Segunda", "Terça", "Quarta", "Quinta", "Sexta"]},
+        {"id": "doctor-2", "name": "Dra. Ana Santos", "specialty": "Ortodontista", "unit_id": "unit-1", "cro": "AM-12346", "phone": "(92) 99999-2222", "email": "ana@odonto.com", "photo_hash": None, "photo_url": None, "bio": "Especialista em aparelhos ortodônticos", "available_days": ["Segunda", "Quarta", "Sexta"]},
+        {"id": "doctor-3", "name": "Dr. Pedro Oliveira", "specialty": "Endodontista", "unit_id": "unit-2", "cro": "AM-12347", "phone": "(92) 99999-3333", "email": "pedro@odonto.com", "photo_hash": None, "photo_url": None, "bio": "Especialista em tratamento de canal", "available_days": ["Terça", "Quinta", "Sexta"]},
+        {"id": "doctor-4", "name": "Dra. Maria Costa", "specialty": "Clínico Geral", "unit_id": "unit-2", "cro": "AM-12348", "phone": "(92) 99999-4444", "email": "maria@odonto.com", "photo_hash": None, "photo_url": None, "bio": "8 anos de experiência em procedimentos estéticos", "available_days": ["Segunda", "Terça", "Quarta", "Quinta"]}
     ]
     await db.doctors.insert_many(doctors)
     
@@ -513,7 +1995,7 @@ async def ensure_admin_user():
             "id": str(uuid.uuid4()),
             "name": "Administrador",
             "email": "admin@odonto.com",
-            "password": get_password_hash("admin123"),
+            "password": await get_password_hash("admin123"),
             "role": "admin",
             "permissions": ["all"],
             "active": True,
@@ -609,7 +2091,7 @@ async def get_me(current_user: dict = Depends(get_current_user)):
 @admin_router.post("/auth/login")
 async def staff_login(credentials: StaffLogin):
     staff = await db.staff.find_one({"email": credentials.email})
-    if not staff or not verify_password(credentials.password, staff["password"]):
+    if not staff or not await verify_password(credentials.password, staff["password"]):
         raise HTTPException(status_code=401, detail="Email ou senha inválidos")
     
     if not staff.get("active", True):
@@ -644,7 +2126,7 @@ async def create_staff(staff_data: StaffCreate, current_user: dict = Depends(get
         "id": staff_id,
         "name": staff_data.name,
         "email": staff_data.email,
-        "password": get_password_hash(staff_data.password),
+        "password": await get_password_hash(staff_data.password),
         "role": staff_data.role,
         "permissions": staff_data.permissions,
         "unit_id": staff_data.unit_id,
@@ -662,10 +2144,11 @@ async def update_staff(staff_id: str, staff_data: StaffUpdate, current_user: dic
     
     update_dict = {k: v for k, v in staff_data.dict().items() if v is not None}
     if "password" in update_dict:
-        update_dict["password"] = get_password_hash(update_dict["password"])
+        update_dict["password"] = await get_password_hash(update_dict["password"])
     
     if update_dict:
         await db.staff.update_one({"id": staff_id}, {"$set": update_dict})
+        invalidate_principal("staff", staff_id)
     
     staff = await db.staff.find_one({"id": staff_id})
     return StaffResponse(**{k: staff[k] for k in ["id", "name", "email", "role", "permissions", "active", "created_at"]}, unit_id=staff.get("unit_id"))
@@ -676,20 +2159,23 @@ async def delete_staff(staff_id: str, current_user: dict = Depends(get_staff_use
         raise HTTPException(status_code=403, detail="Apenas administradores podem remover colaboradores")
     
     await db.staff.delete_one({"id": staff_id})
+    invalidate_principal("staff", staff_id)
     return {"message": "Colaborador removido"}
 
 # ==================== UNITS ROUTES ====================
 
 @api_router.get("/units")
-async def get_units():
-    units = await db.units.find().to_list(100)
-    return [Unit(**u) for u in units]
+async def get_units(request: Request):
+    async def build():
+        return [Unit(**u) for u in await catalog.all("units")]
+    return await conditional_json(request, ("units",), "units", build)
 
 @admin_router.post("/units")
 async def create_unit(unit_data: UnitCreate, current_user: dict = Depends(get_staff_user)):
     unit_id = str(uuid.uuid4())
     unit_dict = {"id": unit_id, **unit_data.dict()}
     await db.units.insert_one(unit_dict)
+    catalog.invalidate("units")
     return Unit(**unit_dict)
 
 @admin_router.put("/units/{unit_id}")
@@ -697,32 +2183,37 @@ async def update_unit(unit_id: str, unit_data: UnitUpdate, current_user: dict =
     update_dict = {k: v for k, v in unit_data.dict().items() if v is not None}
     if update_dict:
         await db.units.update_one({"id": unit_id}, {"$set": update_dict})
+        catalog.invalidate("units")
     unit = await db.units.find_one({"id": unit_id})
     return Unit(**unit)
 
 @admin_router.delete("/units/{unit_id}")
 async def delete_unit(unit_id: str, current_user: dict = Depends(get_staff_user)):
     await db.units.delete_one({"id": unit_id})
+    catalog.invalidate("units")
     return {"message": "Unidade removida"}
 
 # ==================== SERVICES ROUTES ====================
 
 @api_router.get("/services")
-async def get_services():
-    services = await db.services.find().to_list(100)
-    # Return without price for patients
-    return [{"id": s["id"], "name": s["name"], "description": s["description"], "duration_minutes": s["duration_minutes"]} for s in services]
+async def get_services(request: Request):
+    async def build():
+        # Return without price for patients
+        return [{"id": s["id"], "name": s["name"], "description": s["description"], "duration_minutes": s["duration_minutes"]} for s in await catalog.all("services")]
+    return await conditional_json(request, ("services",), "services", build)
 
 @admin_router.get("/services")
-async def get_services_admin(current_user: dict = Depends(get_staff_user)):
-    services = await db.services.find().to_list(100)
-    return [Service(**s) for s in services]
+async def get_services_admin(request: Request, current_user: dict = Depends(get_staff_user)):
+    async def build():
+        return [Service(**s) for s in await catalog.all("services")]
+    return await conditional_json(request, ("services", "admin"), "services", build, "private, no-cache")
 
 @admin_router.post("/services")
 async def create_service(service_data: ServiceCreate, current_user: dict = Depends(get_staff_user)):
     service_id = str(uuid.uuid4())
     service_dict = {"id": service_id, **service_data.dict()}
     await db.services.insert_one(service_dict)
+    catalog.invalidate("services")
     return Service(**service_dict)
 
 @admin_router.put("/services/{service_id}")
@@ -730,45 +2221,91 @@ async def update_service(service_id: str, service_data: ServiceUpdate, current_u
     update_dict = {k: v for k, v in service_data.dict().items() if v is not None}
     if update_dict:
         await db.services.update_one({"id": service_id}, {"$set": update_dict})
+        catalog.invalidate("services")
     service = await db.services.find_one({"id": service_id})
     return Service(**service)
 
 @admin_router.delete("/services/{service_id}")
 async def delete_service(service_id: str, current_user: dict = Depends(get_staff_user)):
     await db.services.delete_one({"id": service_id})
+    catalog.invalidate("services")
     return {"message": "Serviço removido"}
 
 # ==================== DOCTORS ROUTES ====================
 
 @api_router.get("/doctors")
-async def get_doctors(unit_id: Optional[str] = None):
-    query = {"unit_id": unit_id} if unit_id else {}
-    doctors = await db.doctors.find(query).to_list(100)
-    return [Doctor(**d) for d in doctors]
+async def get_doctors(request: Request, unit_id: Optional[str] = None):
+    async def build():
+        return [Doctor(**d) for d in await catalog.all("doctors") if not unit_id or d.get("unit_id") == unit_id]
+    if unit_id and not await catalog.get("units", unit_id):
+        # Only known units get a cache slot
+        return await build()
+    return await conditional_json(request, ("doctors", unit_id or ""), "doctors", build)
+
+@api_router.get("/doctors/{doctor_id}/photo")
+async def get_doctor_photo(doctor_id: str, request: Request, size: str = "md"):
+    """Serve a doctor photo thumbnail; URLs carry the photo hash, so they can be cached forever"""
+    if size not in DOCTOR_PHOTO_SIZES:
+        raise HTTPException(status_code=400, detail="Tamanho inválido")
+    doctor = await catalog.get("doctors", doctor_id)
+    if not doctor or not doctor.get("photo_hash"):
+        raise HTTPException(status_code=404, detail="Foto não encontrada")
+    
+    headers = {
+        "ETag": f'"{doctor["photo_hash"]}-{size}"',
+        "Cache-Control": "public, max-age=31536000, immutable"
+    }
+    if _etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    
+    filename = _photo_filename(doctor_id, doctor["photo_hash"], size)
+    data = photo_bytes_cache.get(filename)
+    if data is None:
+        try:
+            stream = await photo_bucket.open_download_stream_by_name(filename)
+        except NoFile:
+            raise HTTPException(status_code=404, detail="Foto não encontrada")
+        data = await stream.read()
+        photo_bytes_cache.set(filename, data)
+    
+    return Response(content=data, media_type="image/jpeg", headers=headers)
 
 @admin_router.get("/doctors")
 async def get_doctors_admin(current_user: dict = Depends(get_staff_user)):
-    doctors = await db.doctors.find().to_list(100)
+    doctors = await catalog.all("doctors")
     return [Doctor(**d) for d in doctors]
 
 @admin_router.post("/doctors")
 async def create_doctor(doctor_data: DoctorCreate, current_user: dict = Depends(get_staff_user)):
     doctor_id = str(uuid.uuid4())
-    doctor_dict = {"id": doctor_id, **doctor_data.dict()}
+    doctor_dict = {"id": doctor_id, **doctor_data.dict(exclude={"photo_base64"}), "photo_hash": None, "photo_url": None}
+    if doctor_data.photo_base64:
+        doctor_dict.update(await store_doctor_photo(doctor_id, doctor_data.photo_base64))
     await db.doctors.insert_one(doctor_dict)
+    catalog.invalidate("doctors")
     return Doctor(**doctor_dict)
 
 @admin_router.put("/doctors/{doctor_id}")
 async def update_doctor(doctor_id: str, doctor_data: DoctorUpdate, current_user: dict = Depends(get_staff_user)):
+    if not await db.doctors.find_one({"id": doctor_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Doutor não encontrado")
     update_dict = {k: v for k, v in doctor_data.dict().items() if v is not None}
+    photo_base64 = update_dict.pop("photo_base64", None)
+    if photo_base64:
+        update_dict.update(await store_doctor_photo(doctor_id, photo_base64))
     if update_dict:
         await db.doctors.update_one({"id": doctor_id}, {"$set": update_dict})
+        catalog.invalidate("doctors")
     doctor = await db.doctors.find_one({"id": doctor_id})
+    if not doctor:
+        raise HTTPException(status_code=404, detail="Doutor não encontrado")
     return Doctor(**doctor)
 
 @admin_router.delete("/doctors/{doctor_id}")
 async def delete_doctor(doctor_id: str, current_user: dict = Depends(get_staff_user)):
     await db.doctors.delete_one({"id": doctor_id})
+    await delete_doctor_photos(doctor_id)
+    catalog.invalidate("doctors")
     return {"message": "Doutor removido"}
 
 # ==================== APPOINTMENTS ROUTES ====================
@@ -776,45 +2313,136 @@ async def delete_doctor(doctor_id: str, current_user: dict = Depends(get_staff_u
 @api_router.get("/appointments/booked-slots")
 async def get_booked_slots(doctor_id: str, date: str):
     """Get booked time slots for a doctor on a specific date"""
-    appointments = await db.appointments.find({
+    await slot_bitmaps.ensure([doctor_id], [date])
+    if slot_bitmaps.has(doctor_id, date):
+        bits = slot_bitmaps.bits(doctor_id, date)
+    else:
+        bits = await slot_bitmaps.fetch(doctor_id, date)
+    booked_times = [time_str for time_str, _, mask in candidate_masks(0) if bits & mask]
+    blocked = [{"start": start, "end": end} for start, end in bitmap_intervals(bits)]
+    return {"booked_times": booked_times, "blocked": blocked, "date": date, "doctor_id": doctor_id}
+
+@api_router.get("/appointments/availability")
+async def get_availability(
+    unit_id: str,
+    service_id: str,
+    date_from: str = Query(..., alias="from"),
+    date_to: str = Query(..., alias="to"),
+    doctor_id: Optional[str] = None
+):
+    """Free start times per doctor and day over a DD/MM/YYYY date range.
+    
+    A start time is free when the doctor works that weekday, it is not in
+    the past and the service's duration does not overlap an active
+    appointment. Occupancy comes from the in-memory slot bitmaps.
+    """
+    service = await catalog.get("services", service_id)
+    if not service:
+        raise HTTPException(status_code=400, detail="Dados inválidos")
+    first_day = parse_br_date(date_from)
+    last_day = parse_br_date(date_to)
+    if not first_day or not last_day or last_day < first_day:
+        raise HTTPException(status_code=400, detail="Data inválida")
+    if (last_day - first_day).days >= AVAILABILITY_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Período máximo de {AVAILABILITY_MAX_DAYS} dias")
+    if last_day.date() > datetime.now(BRT).date() + timedelta(days=SLOT_BITMAP_HORIZON_DAYS):
+        raise HTTPException(status_code=400, detail=f"Agendamentos até {SLOT_BITMAP_HORIZON_DAYS} dias à frente")
+    
+    doctors = [
+        d for d in await catalog.all("doctors")
+        if d.get("unit_id") == unit_id and (not doctor_id or d["id"] == doctor_id)
+    ]
+    if not doctors:
+        return {"from": date_from, "to": date_to, "service_id": service_id, "doctors": []}
+    
+    days = [first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1)]
+    date_strs = [day.strftime("%d/%m/%Y") for day in days]
+    now = datetime.now(BRT)
+    # Past days have no free times, so only today onwards needs bitmaps
+    await slot_bitmaps.ensure(
+        [d["id"] for d in doctors],
+        [date_str for day, date_str in zip(days, date_strs) if day.date() >= now.date()]
+    )
+    
+    duration = service.get("duration_minutes", 0)
+    now_minute = now.hour * 60 + now.minute
+    result = []
+    for doctor in doctors:
+        working = set(doctor.get("available_days") or [])
+        doctor_days = []
+        for day, date_str in zip(days, date_strs):
+            if WEEKDAYS_PT[day.weekday()] not in working:
+                continue
+            if day.date() < now.date():
+                times = []
+            else:
+                after = now_minute if day.date() == now.date() else -1
+                times = slot_bitmaps.free_times(doctor["id"], date_str, duration, after)
+            doctor_days.append({"date": date_str, "times": times})
+        result.append({"doctor_id": doctor["id"], "doctor_name": doctor["name"], "days": doctor_days})
+    
+    return {
+        "from": date_from,
+        "to": date_to,
+        "service_id": service_id,
+        "duration_minutes": duration,
+        "doctors": result
+    }
+
+async def find_overlapping(doctor_id, starts_at, ends_at, exclude_id=None):
+    """An active appointment of the doctor overlapping [starts_at, ends_at), if any.
+    
+    Matches on each appointment's stored ends_at, so a booking whose service
+    was later shortened or deleted is still found. The doctor_ends_at index
+    scans only the doctor's appointments ending after starts_at, i.e. the
+    upcoming ones, and filters starts_at from the index keys.
+    """
+    query = {
         "doctor_id": doctor_id,
-        "date": date,
+        "ends_at": {"$gt": starts_at},
+        "starts_at": {"$lt": ends_at},
         "status": {"$ne": "cancelado"}
-    }).to_list(100)
-    
-    booked_times = [apt["time"] for apt in appointments]
-    return {"booked_times": booked_times, "date": date, "doctor_id": doctor_id}
+    }
+    if exclude_id:
+        query["id"] = {"$ne": exclude_id}
+    return await db.appointments.find_one(query, {"_id": 0, "id": 1})
+
+async def reserve_appointment(appointment_dict):
+    """Insert an appointment unless it collides with another one for the doctor.
+    
+    The insert comes first: the doctor_slot_unique index rejects the same
+    start time atomically, and the overlap check that follows sees any
+    concurrent booking already inserted, so of two overlapping requests at
+    least one (possibly both) backs out.
+    """
+    try:
+        await db.appointments.insert_one(appointment_dict)
+    except DuplicateKeyError:
+        return False
+    if appointment_dict.get("starts_at") and await find_overlapping(
+        appointment_dict["doctor_id"], appointment_dict["starts_at"], appointment_dict["ends_at"], appointment_dict["id"]
+    ):
+        # Both overlapping requests may see each other and back out; neither
+        # is booked and the patients pick the slot again. Until the delete
+        # the row is visible, so drop any bitmap day that loaded it.
+        await db.appointments.delete_one({"id": appointment_dict["id"]})
+        slot_bitmaps.release(appointment_dict)
+        return False
+    return True
 
 @api_router.post("/appointments")
 async def create_appointment(appointment: AppointmentCreate, current_user: dict = Depends(get_current_user)):
-    unit = await db.units.find_one({"id": appointment.unit_id})
-    service = await db.services.find_one({"id": appointment.service_id})
-    doctor = await db.doctors.find_one({"id": appointment.doctor_id})
+    unit = await catalog.get("units", appointment.unit_id)
+    service = await catalog.get("services", appointment.service_id)
+    doctor = await catalog.get("doctors", appointment.doctor_id)
     
     if not unit or not service or not doctor:
         raise HTTPException(status_code=400, detail="Dados inválidos")
     
     # Server-side validation: Check for past date/time (Brazil UTC-3)
-    now_brazil = get_brazil_now()
-    apt_date = parse_br_date(appointment.date)
-    if apt_date:
-        try:
-            hour, minute = appointment.time.split(":")
-            apt_datetime = apt_date.replace(hour=int(hour), minute=int(minute))
-            if apt_datetime < now_brazil:
-                raise HTTPException(status_code=400, detail="Não é possível agendar em horários passados")
-        except ValueError:
-            pass
-    
-    # Server-side validation: Check for double booking
-    existing = await db.appointments.find_one({
-        "doctor_id": appointment.doctor_id,
-        "date": appointment.date,
-        "time": appointment.time,
-        "status": {"$ne": "cancelado"}
-    })
-    if existing:
-        raise HTTPException(status_code=400, detail="Este horário já está ocupado para o profissional selecionado")
+    starts_at, ends_at = appointment_window(appointment.date, appointment.time, service.get("duration_minutes", 0))
+    if starts_at and starts_at < datetime.utcnow():
+        raise HTTPException(status_code=400, detail="Não é possível agendar em horários passados")
     
     appointment_id = str(uuid.uuid4())
     appointment_dict = {
@@ -831,12 +2459,18 @@ async def create_appointment(appointment: AppointmentCreate, current_user: dict
         "doctor_name": doctor["name"],
         "date": appointment.date,
         "time": appointment.time,
+        "starts_at": starts_at,
+        "ends_at": ends_at,
         "status": "agendado",
+        "slot_claimed": True,
         "notes": appointment.notes or "",
         "paid_value": 0,
         "created_at": datetime.utcnow()
     }
-    await db.appointments.insert_one(appointment_dict)
+    if not await reserve_appointment(appointment_dict):
+        raise HTTPException(status_code=400, detail="Este horário já está ocupado para o profissional selecionado")
+    slot_bitmaps.occupy(appointment_dict)
+    reminder_scheduler.schedule(appointment_dict)
     
     # Emit real-time event to admin
     await emit_to_admin('new_appointment', {
@@ -853,70 +2487,135 @@ async def create_appointment(appointment: AppointmentCreate, current_user: dict
     return AppointmentResponse(**appointment_dict)
 
 @api_router.get("/appointments")
-async def get_appointments(current_user: dict = Depends(get_current_user)):
-    appointments = await db.appointments.find({"user_id": current_user["id"]}).sort("created_at", -1).to_list(100)
+async def get_appointments(
+    response: Response,
+    limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    appointments = await paginate(
+        db.appointments, {"user_id": current_user["id"]}, [("created_at", DESCENDING), ("id", DESCENDING)],
+        response, limit, cursor, include_total
+    )
     return [AppointmentResponse(**apt) for apt in appointments]
 
 @api_router.delete("/appointments/{appointment_id}")
 async def cancel_appointment(appointment_id: str, current_user: dict = Depends(get_current_user)):
-    result = await db.appointments.update_one(
-        {"id": appointment_id, "user_id": current_user["id"]},
-        {"$set": {"status": "cancelado"}}
+    apt = await db.appointments.find_one_and_update(
+        {"id": appointment_id, "user_id": current_user["id"], "status": {"$ne": "cancelado"}},
+        {"$set": {"status": "cancelado"}, "$unset": {"slot_claimed": ""}},
+        return_document=ReturnDocument.BEFORE
     )
-    if result.modified_count == 0:
+    if not apt:
         raise HTTPException(status_code=404, detail="Agendamento não encontrado")
     
+    await apply_rollup_delta(apt, {**apt, "status": "cancelado"})
+    slot_bitmaps.release(apt)
+    reminder_scheduler.unschedule(appointment_id)
+    
     # Emit to admin
-    apt = await db.appointments.find_one({"id": appointment_id})
-    if apt:
-        await emit_to_admin('appointment_cancelled', {
-            "id": appointment_id,
-            "patient_name": apt.get("user_name", ""),
-            "date": apt.get("date", ""),
-            "time": apt.get("time", ""),
-            "timestamp": datetime.utcnow().isoformat()
-        })
+    await emit_to_admin('appointment_cancelled', {
+        "id": appointment_id,
+        "patient_name": apt.get("user_name", ""),
+        "date": apt.get("date", ""),
+        "time": apt.get("time", ""),
+        "timestamp": datetime.utcnow().isoformat()
+    })
     
     return {"message": "Agendamento cancelado"}
 
+def build_appointments_query(status=None, date=None, doctor_id=None, unit_id=None):
+    """Filter shared by the admin appointment list and the appointment export"""
+    query = {}
+    if status:
+        query["status"] = status
+    if date:
+        day_start, day_end = br_day_range(date)
+        if day_start is None:
+            raise HTTPException(status_code=400, detail="Data inválida")
+        query["starts_at"] = {"$gte": day_start, "$lt": day_end}
+    if doctor_id:
+        query["doctor_id"] = doctor_id
+    if unit_id:
+        query["unit_id"] = unit_id
+    return query
+
 # Admin appointments
 @admin_router.get("/appointments")
 async def get_all_appointments(
+    response: Response,
     status: Optional[str] = None,
     date: Optional[str] = None,
     doctor_id: Optional[str] = None,
     unit_id: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
     current_user: dict = Depends(get_staff_user)
 ):
-    query = {}
-    if status:
-        query["status"] = status
-    if date:
-        query["date"] = date
-    if doctor_id:
-        query["doctor_id"] = doctor_id
-    if unit_id:
-        query["unit_id"] = unit_id
-    
-    appointments = await db.appointments.find(query).sort("date", -1).to_list(500)
+    query = build_appointments_query(status, date, doctor_id, unit_id)
+    appointments = await paginate(
+        db.appointments, query, [("starts_at", DESCENDING), ("id", DESCENDING)],
+        response, limit, cursor, include_total
+    )
     return [AppointmentResponse(**apt) for apt in appointments]
 
 @admin_router.put("/appointments/{appointment_id}")
 async def update_appointment(appointment_id: str, data: AppointmentUpdate, current_user: dict = Depends(get_staff_user)):
     update_dict = {k: v for k, v in data.dict().items() if v is not None}
     
+    apt = await db.appointments.find_one({"id": appointment_id})
+    if not apt:
+        raise HTTPException(status_code=404, detail="Agendamento não encontrado")
+    
     if "status" in update_dict and update_dict["status"] == "concluido":
-        # Get appointment to add to financial
-        apt = await db.appointments.find_one({"id": appointment_id})
-        if apt:
-            paid_value = update_dict.get("paid_value", apt.get("service_price", 0))
-            update_dict["paid_value"] = paid_value
-            update_dict["completed_at"] = datetime.utcnow()
+        # Add to financial
+        paid_value = update_dict.get("paid_value", apt.get("service_price", 0))
+        update_dict["paid_value"] = paid_value
+        update_dict["completed_at"] = datetime.utcnow()
+    
+    if "starts_at" not in apt:
+        # Appointments created before starts_at existed get it on their first update
+        service = await catalog.get("services", apt.get("service_id"))
+        starts_at, ends_at = appointment_window(apt.get("date", ""), apt.get("time", ""), service.get("duration_minutes", 0) if service else 0)
+        if starts_at:
+            update_dict["starts_at"] = starts_at
+            update_dict["ends_at"] = ends_at
+    
+    update = {"$set": update_dict}
+    if update_dict.get("status") == "cancelado":
+        update["$unset"] = {"slot_claimed": ""}
+    elif "status" in update_dict and apt.get("status") == "cancelado":
+        # Reactivating a cancelled appointment claims its slot again
+        starts_at = update_dict.get("starts_at", apt.get("starts_at"))
+        ends_at = update_dict.get("ends_at", apt.get("ends_at"))
+        if starts_at and await find_overlapping(apt["doctor_id"], starts_at, ends_at, appointment_id):
+            raise HTTPException(status_code=400, detail="Este horário já está ocupado para o profissional selecionado")
+        update_dict["slot_claimed"] = True
     
     if update_dict:
-        await db.appointments.update_one({"id": appointment_id}, {"$set": update_dict})
-    
-    apt = await db.appointments.find_one({"id": appointment_id})
+        try:
+            before = await db.appointments.find_one_and_update(
+                {"id": appointment_id},
+                update,
+                return_document=ReturnDocument.BEFORE
+            )
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="Este horário já está ocupado para o profissional selecionado")
+        if not before:
+            raise HTTPException(status_code=404, detail="Agendamento não encontrado")
+        apt = {**before, **update_dict}
+        await apply_rollup_delta(before, apt)
+        if before.get("status") != apt.get("status"):
+            if apt.get("status") == "cancelado":
+                slot_bitmaps.release(before)
+            elif before.get("status") == "cancelado":
+                slot_bitmaps.occupy(apt)
+            if apt.get("status") == "agendado":
+                reminder_scheduler.schedule(apt)
+            else:
+                reminder_scheduler.unschedule(appointment_id)
     
     # Emit status change to admin and patient
     if apt:
@@ -941,32 +2640,23 @@ async def update_appointment(appointment_id: str, data: AppointmentUpdate, curre
 @api_router.get("/appointments/reminders")
 async def get_upcoming_reminders(current_user: dict = Depends(get_current_user)):
     """Get appointments within the next 24 hours for push notification"""
-    now_brazil = get_brazil_now()
-    tomorrow = now_brazil + timedelta(hours=24)
+    now = datetime.utcnow()
+    tomorrow = now + timedelta(hours=24)
     
     appointments = await db.appointments.find({
         "user_id": current_user["id"],
-        "status": "agendado"
-    }).to_list(100)
-    
-    reminders = []
-    for apt in appointments:
-        apt_date = parse_br_date(apt.get("date", ""))
-        if apt_date:
-            try:
-                hour, minute = apt.get("time", "00:00").split(":")
-                apt_datetime = apt_date.replace(hour=int(hour), minute=int(minute))
-                if now_brazil < apt_datetime <= tomorrow:
-                    reminders.append({
-                        "id": apt["id"],
-                        "date": apt["date"],
-                        "time": apt["time"],
-                        "doctor_name": apt.get("doctor_name", ""),
-                        "service_name": apt.get("service_name", ""),
-                        "unit_name": apt.get("unit_name", ""),
-                    })
-            except (ValueError, AttributeError):
-                pass
+        "status": "agendado",
+        "starts_at": {"$gt": now, "$lte": tomorrow}
+    }).sort("starts_at", 1).to_list(100)
+    
+    reminders = [{
+        "id": apt["id"],
+        "date": apt["date"],
+        "time": apt["time"],
+        "doctor_name": apt.get("doctor_name", ""),
+        "service_name": apt.get("service_name", ""),
+        "unit_name": apt.get("unit_name", ""),
+    } for apt in appointments]
     
     return {"reminders": reminders}
 
@@ -974,87 +2664,190 @@ async def get_upcoming_reminders(current_user: dict = Depends(get_current_user))
 
 @admin_router.get("/financial/summary")
 async def get_financial_summary(
-    month: Optional[int] = None,
+    month: Optional[int] = Query(None, ge=1, le=12),
     year: Optional[int] = None,
     unit_id: Optional[str] = None,
+    include_appointments: bool = False,
+    page: int = 1,
+    page_size: int = 50,
     current_user: dict = Depends(get_staff_user)
 ):
     now = datetime.utcnow()
     target_month = month or now.month
     target_year = year or now.year
+    page = max(page, 1)
+    page_size = min(max(page_size, 1), 200)
     
-    # Get completed appointments
-    query = {"status": "concluido"}
+    # Totals come from the pre-aggregated daily rollups of the month
+    month_start = f"{target_year:04d}-{target_month:02d}-01"
+    month_end = f"{target_year + 1:04d}-01-01" if target_month == 12 else f"{target_year:04d}-{target_month + 1:02d}-01"
+    rollup_query = {"day": {"$gte": month_start, "$lt": month_end}}
     if unit_id:
-        query["unit_id"] = unit_id
-    
-    appointments = await db.appointments.find(query).to_list(1000)
-    
-    # Filter by month/year based on date string (DD/MM/YYYY)
-    monthly_total = 0
-    monthly_appointments = []
+        rollup_query["unit_id"] = unit_id
+    
+    facets = {
+        "totals": [
+            {"$group": {"_id": None, "total_revenue": {"$sum": "$revenue"}, "total_appointments": {"$sum": "$appointments"}}}
+        ],
+        "clinics": [
+            # $last then takes the name stored on the unit's most recent day
+            {"$sort": {"day": 1}},
+            {"$group": {
+                "_id": "$unit_id",
+                "unit_name": {"$last": {"$ifNull": ["$unit_name", "Sem unidade"]}},
+                "total_revenue": {"$sum": "$revenue"},
+                "total_appointments": {"$sum": "$appointments"}
+            }},
+            {"$match": {"total_appointments": {"$gt": 0}}},
+            {"$sort": {"total_revenue": -1}}
+        ],
+    }
+    result = await db.financial_rollups.aggregate([{"$match": rollup_query}, {"$facet": facets}]).to_list(1)
+    facet = result[0] if result else {}
     
-    # Per-clinic breakdown
-    clinic_totals = {}
+    totals = facet.get("totals") or [{"total_revenue": 0, "total_appointments": 0}]
+    monthly_total = totals[0]["total_revenue"]
+    monthly_count = totals[0]["total_appointments"]
+    avg_ticket = monthly_total / monthly_count if monthly_count else 0
+    units = {u["id"]: u["name"] for u in await catalog.all("units")}
     
-    for apt in appointments:
-        try:
-            date_parts = apt["date"].split("/")
-            if len(date_parts) == 3:
-                apt_month = int(date_parts[1])
-                apt_year = int(date_parts[2])
-                if apt_month == target_month and apt_year == target_year:
-                    paid = apt.get("paid_value", 0)
-                    monthly_total += paid
-                    monthly_appointments.append(apt)
-                    
-                    # Per-clinic
-                    clinic_name = apt.get("unit_name", "Sem unidade")
-                    clinic_id = apt.get("unit_id", "")
-                    if clinic_id not in clinic_totals:
-                        clinic_totals[clinic_id] = {
-                            "unit_id": clinic_id,
-                            "unit_name": clinic_name,
-                            "total_revenue": 0,
-                            "total_appointments": 0
-                        }
-                    clinic_totals[clinic_id]["total_revenue"] += paid
-                    clinic_totals[clinic_id]["total_appointments"] += 1
-        except Exception:
-            pass
-    
-    avg_ticket = monthly_total / len(monthly_appointments) if monthly_appointments else 0
-    
-    return {
+    summary = {
         "month": target_month,
         "year": target_year,
         "total_revenue": monthly_total,
-        "total_appointments": len(monthly_appointments),
+        "total_appointments": monthly_count,
         "average_ticket": avg_ticket,
-        "clinic_breakdown": list(clinic_totals.values()),
-        "appointments": [AppointmentResponse(**a) for a in monthly_appointments]
+        "clinic_breakdown": [{
+            "unit_id": c["_id"],
+            "unit_name": units.get(c["_id"], c["unit_name"]),
+            "total_revenue": c["total_revenue"],
+            "total_appointments": c["total_appointments"]
+        } for c in facet.get("clinics", [])]
     }
+    
+    if include_appointments:
+        range_start, range_end = br_month_range(target_year, target_month)
+        query = {"status": "concluido", "starts_at": {"$gte": range_start, "$lt": range_end}}
+        if unit_id:
+            query["unit_id"] = unit_id
+        # One extra row tells us whether there is a next page
+        rows = await db.appointments.find(query).sort([("starts_at", -1), ("id", 1)]).skip((page - 1) * page_size).limit(page_size + 1).to_list(page_size + 1)
+        summary["appointments"] = [AppointmentResponse(**a) for a in rows[:page_size]]
+        summary["page"] = page
+        summary["page_size"] = page_size
+        summary["has_more"] = len(rows) > page_size
+    
+    return summary
 
 @admin_router.get("/financial/daily")
-async def get_daily_financial(date: str, current_user: dict = Depends(get_staff_user)):
-    appointments = await db.appointments.find({
+async def get_daily_financial(date: str, include_appointments: bool = False, current_user: dict = Depends(get_staff_user)):
+    day = rollup_day(date)
+    if day is None:
+        raise HTTPException(status_code=400, detail="Data inválida")
+    
+    rollups = await db.financial_rollups.find({"day": day}).to_list(None)
+    
+    daily = {
         "date": date,
-        "status": "concluido"
-    }).to_list(100)
+        "total_revenue": sum(r.get("revenue", 0) for r in rollups),
+        "total_appointments": sum(r.get("appointments", 0) for r in rollups)
+    }
+    
+    if include_appointments:
+        day_start, day_end = br_day_range(date)
+        appointments = await db.appointments.find({
+            "status": "concluido",
+            "starts_at": {"$gte": day_start, "$lt": day_end}
+        }).sort("starts_at", 1).to_list(None)
+        daily["appointments"] = [AppointmentResponse(**a) for a in appointments]
+    
+    return daily
+
+# ==================== DASHBOARD ROUTES ====================
+
+@admin_router.get("/dashboard/stats")
+async def get_dashboard_stats(unit_id: Optional[str] = None, current_user: dict = Depends(get_staff_user)):
+    """Headline numbers for the admin dashboard.
+    
+    unit_id scopes today's appointments and the month revenue; patients and
+    inventory are not tied to a unit and are always counted globally.
+    """
+    now_brazil = get_brazil_now()
+    day_start, day_end = br_day_range(now_brazil.strftime("%d/%m/%Y"))
+    appointments_query = {"starts_at": {"$gte": day_start, "$lt": day_end}}
+    
+    month_start = now_brazil.strftime("%Y-%m-01")
+    next_month = (now_brazil.replace(day=28) + timedelta(days=4)).replace(day=1)
+    rollup_query = {"day": {"$gte": month_start, "$lt": next_month.strftime("%Y-%m-01")}}
     
-    total = sum(apt.get("paid_value", 0) for apt in appointments)
+    if unit_id:
+        appointments_query["unit_id"] = unit_id
+        rollup_query["unit_id"] = unit_id
+    
+    async def month_revenue():
+        result = await db.financial_rollups.aggregate([
+            {"$match": rollup_query},
+            {"$group": {"_id": None, "total": {"$sum": "$revenue"}}}
+        ]).to_list(1)
+        return result[0]["total"] if result else 0
+    
+    today_appointments, revenue, total_patients, low_stock = await asyncio.gather(
+        db.appointments.count_documents(appointments_query),
+        month_revenue(),
+        db.users.estimated_document_count(),
+        db.inventory.count_documents({"low_stock": True}),
+    )
     
     return {
-        "date": date,
-        "total_revenue": total,
-        "appointments": [AppointmentResponse(**a) for a in appointments]
+        "today_appointments": today_appointments,
+        "month_revenue": revenue,
+        "total_patients": total_patients,
+        "low_stock_items": low_stock
     }
 
 # ==================== INVENTORY ROUTES ====================
 
+# An item is low on stock once quantity drops to min_quantity. The stored
+# low_stock flag is recomputed inside every stock write, so it never drifts.
+LOW_STOCK_EXPR = {"$lte": ["$quantity", "$min_quantity"]}
+
+def is_low_stock(item):
+    return item.get("quantity", 0) <= item.get("min_quantity", 0)
+
+async def notify_stock_change(item, was_low):
+    """Tell the admin panel when an item crosses its minimum quantity"""
+    now_low = is_low_stock(item)
+    if now_low == was_low:
+        return
+    await emit_to_admin('low_stock', {
+        "item_id": item["id"],
+        "name": item.get("name", ""),
+        "quantity": item.get("quantity", 0),
+        "min_quantity": item.get("min_quantity", 0),
+        "low_stock": now_low,
+        "timestamp": datetime.utcnow().isoformat()
+    })
+
+def stock_change_pipeline(delta, movement_dict):
+    """Update pipeline applying a movement and queueing its ledger entry in the outbox"""
+    return [
+        {"$set": {
+            "quantity": {"$add": ["$quantity", delta]},
+            "pending_movements": {"$concatArrays": [
+                {"$ifNull": ["$pending_movements", []]}, [{"$literal": movement_dict}]
+            ]}
+        }},
+        {"$set": {"low_stock": LOW_STOCK_EXPR}}
+    ]
+
 @admin_router.get("/inventory")
 async def get_inventory(current_user: dict = Depends(get_staff_user)):
-    items = await db.inventory.find().to_list(500)
+    items = await db.inventory.find({}, {"pending_movements": 0}).to_list(500)
+    return serialize_docs(items)
+
+@admin_router.get("/inventory/low-stock")
+async def get_low_stock_inventory(current_user: dict = Depends(get_staff_user)):
+    items = await db.inventory.find({"low_stock": True}, {"pending_movements": 0}).sort("name", ASCENDING).to_list(500)
     return serialize_docs(items)
 
 @admin_router.post("/inventory")
@@ -1063,6 +2856,7 @@ async def create_inventory_item(item_data: InventoryItemCreate, current_user: di
     item_dict = {
         "id": item_id,
         **item_data.dict(),
+        "low_stock": item_data.quantity <= item_data.min_quantity,
         "created_at": datetime.utcnow()
     }
     await db.inventory.insert_one(item_dict)
@@ -1086,38 +2880,53 @@ async def create_inventory_item(item_data: InventoryItemCreate, current_user: di
 @admin_router.put("/inventory/{item_id}")
 async def update_inventory_item(item_id: str, item_data: InventoryItemUpdate, current_user: dict = Depends(get_staff_user)):
     update_dict = {k: v for k, v in item_data.dict().items() if v is not None}
-    if update_dict:
-        await db.inventory.update_one({"id": item_id}, {"$set": update_dict})
-    item = await db.inventory.find_one({"id": item_id})
+    if not update_dict:
+        item = await db.inventory.find_one({"id": item_id}, {"pending_movements": 0})
+        return serialize_doc(item)
+    
+    before = await db.inventory.find_one_and_update(
+        {"id": item_id},
+        [{"$set": {k: {"$literal": v} for k, v in update_dict.items()}}, {"$set": {"low_stock": LOW_STOCK_EXPR}}],
+        projection={"pending_movements": 0},
+        return_document=ReturnDocument.BEFORE
+    )
+    if not before:
+        raise HTTPException(status_code=404, detail="Item não encontrado")
+    item = {**before, **update_dict}
+    item["low_stock"] = is_low_stock(item)
+    await notify_stock_change(item, is_low_stock(before))
     return serialize_doc(item)
 
+def movement_delta(movement_type, quantity):
+    """Signed stock change of a movement"""
+    if movement_type == "entrada":
+        return quantity
+    if movement_type == "saida":
+        return -quantity
+    return 0
+
+async def record_inventory_movement(item_id, movement_dict):
+    """Insert a ledger entry from the item's outbox, then clear it from the outbox.
+    
+    The unique index on inventory_movements.id makes a retry after a crash
+    between the two steps harmless.
+    """
+    try:
+        await db.inventory_movements.insert_one(dict(movement_dict))
+    except DuplicateKeyError:
+        pass
+    await db.inventory.update_one({"id": item_id}, {"$pull": {"pending_movements": {"id": movement_dict["id"]}}})
+
 @admin_router.post("/inventory/movement")
 async def add_inventory_movement(movement: InventoryMovement, current_user: dict = Depends(get_staff_user)):
-    item = await db.inventory.find_one({"id": movement.item_id})
-    if not item:
-        raise HTTPException(status_code=404, detail="Item não encontrado")
-    
     doctor_name = ""
     if movement.doctor_id:
-        doctor = await db.doctors.find_one({"id": movement.doctor_id})
+        doctor = await catalog.get("doctors", movement.doctor_id)
         doctor_name = doctor["name"] if doctor else ""
     
-    # Update quantity
-    new_quantity = item["quantity"]
-    if movement.type == "entrada":
-        new_quantity += movement.quantity
-    elif movement.type == "saida":
-        if item["quantity"] < movement.quantity:
-            raise HTTPException(status_code=400, detail="Quantidade insuficiente em estoque")
-        new_quantity -= movement.quantity
-    
-    await db.inventory.update_one({"id": movement.item_id}, {"$set": {"quantity": new_quantity}})
-    
-    # Log movement
     movement_dict = {
         "id": str(uuid.uuid4()),
         "item_id": movement.item_id,
-        "item_name": item["name"],
         "type": movement.type,
         "quantity": movement.quantity,
         "doctor_id": movement.doctor_id,
@@ -1126,17 +2935,121 @@ async def add_inventory_movement(movement: InventoryMovement, current_user: dict
         "created_at": datetime.utcnow(),
         "created_by": current_user.get("name", "")
     }
-    await db.inventory_movements.insert_one(movement_dict)
+    
+    # The stock change and the outbox entry are one atomic write; a withdrawal
+    # only matches while enough stock is left
+    delta = movement_delta(movement.type, movement.quantity)
+    query = {"id": movement.item_id}
+    if movement.type == "saida":
+        query["quantity"] = {"$gte": movement.quantity}
+    item = await db.inventory.find_one_and_update(
+        query,
+        stock_change_pipeline(delta, movement_dict),
+        projection={"id": 1, "name": 1, "quantity": 1, "min_quantity": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if not item:
+        if movement.type == "saida" and await db.inventory.find_one({"id": movement.item_id}, {"_id": 1}):
+            raise HTTPException(status_code=400, detail="Quantidade insuficiente em estoque")
+        raise HTTPException(status_code=404, detail="Item não encontrado")
+    
+    # The item name is only known once the write returns
+    movement_dict["item_name"] = item["name"]
+    await record_inventory_movement(movement.item_id, movement_dict)
+    await notify_stock_change(item, is_low_stock({**item, "quantity": item["quantity"] - delta}))
 
     return serialize_doc(movement_dict)
 
-@admin_router.get("/inventory/movements")
-async def get_inventory_movements(
-    item_id: Optional[str] = None,
-    type: Optional[str] = None,
-    doctor_id: Optional[str] = None,
-    current_user: dict = Depends(get_staff_user)
-):
+@admin_router.post("/inventory/movements/bulk")
+async def add_inventory_movements_bulk(data: InventoryMovementBulk, current_user: dict = Depends(get_staff_user)):
+    """Apply many movements at once and report the outcome of each line.
+    
+    Items are validated with one $in query and every stock change goes out
+    in one bulk_write, with the same guard and outbox as a single movement.
+    A line was applied if its movement id is in the outbox or, when a
+    concurrent flush_inventory_outbox() got there first, already in the
+    ledger; the outbox is read before the ledger so no applied line is
+    missed. The remaining ledger entries are written with one insert_many.
+    """
+    if not data.movements:
+        return {"results": [], "applied": 0, "failed": 0}
+    if len(data.movements) > INVENTORY_BULK_MAX:
+        raise HTTPException(status_code=400, detail=f"Máximo de {INVENTORY_BULK_MAX} movimentações por envio")
+    
+    item_ids = list({m.item_id for m in data.movements})
+    items = {
+        i["id"]: i
+        async for i in db.inventory.find({"id": {"$in": item_ids}}, {"id": 1, "name": 1, "quantity": 1, "min_quantity": 1})
+    }
+    
+    results = [None] * len(data.movements)
+    lines = []
+    ops = []
+    now = datetime.utcnow()
+    for index, movement in enumerate(data.movements):
+        item = items.get(movement.item_id)
+        if not item:
+            results[index] = {"index": index, "status": "error", "detail": "Item não encontrado"}
+            continue
+        doctor = await catalog.get("doctors", movement.doctor_id) if movement.doctor_id else None
+        movement_dict = {
+            "id": str(uuid.uuid4()),
+            "item_id": movement.item_id,
+            "item_name": item["name"],
+            "type": movement.type,
+            "quantity": movement.quantity,
+            "doctor_id": movement.doctor_id,
+            "doctor_name": doctor["name"] if doctor else "",
+            "notes": movement.notes,
+            "created_at": now,
+            "created_by": current_user.get("name", "")
+        }
+        query = {"id": movement.item_id}
+        if movement.type == "saida":
+            query["quantity"] = {"$gte": movement.quantity}
+        ops.append(UpdateOne(query, stock_change_pipeline(movement_delta(movement.type, movement.quantity), movement_dict)))
+        lines.append((index, movement_dict))
+    
+    if ops:
+        await db.inventory.bulk_write(ops, ordered=True)
+        pending = set()
+        updated_items = []
+        async for item in db.inventory.find(
+            {"id": {"$in": item_ids}},
+            {"id": 1, "name": 1, "quantity": 1, "min_quantity": 1, "pending_movements.id": 1}
+        ):
+            pending.update(p["id"] for p in item.get("pending_movements", []))
+            updated_items.append(item)
+        
+        line_ids = [movement_dict["id"] for _, movement_dict in lines]
+        recorded = {m["id"] async for m in db.inventory_movements.find({"id": {"$in": line_ids}}, {"id": 1})}
+        applied_ids = pending | recorded
+        
+        applied = [movement_dict for _, movement_dict in lines if movement_dict["id"] in pending]
+        if applied:
+            try:
+                await db.inventory_movements.insert_many([dict(m) for m in applied], ordered=False)
+            except BulkWriteError as e:
+                # A concurrent flush may have written some of them already
+                if any(err["code"] != 11000 for err in e.details["writeErrors"]):
+                    raise
+            await db.inventory.update_many(
+                {"id": {"$in": item_ids}},
+                {"$pull": {"pending_movements": {"id": {"$in": [m["id"] for m in applied]}}}}
+            )
+        for item in updated_items:
+            await notify_stock_change(item, is_low_stock(items[item["id"]]))
+        for index, movement_dict in lines:
+            if movement_dict["id"] in applied_ids:
+                results[index] = {"index": index, "status": "ok", "movement": serialize_doc(movement_dict)}
+            else:
+                results[index] = {"index": index, "status": "error", "detail": "Quantidade insuficiente em estoque"}
+    
+    applied_count = sum(1 for r in results if r["status"] == "ok")
+    return {"results": results, "applied": applied_count, "failed": len(results) - applied_count}
+
+def build_movements_query(item_id=None, type=None, doctor_id=None):
+    """Filter shared by the movement history and the movement export"""
     query = {}
     if item_id:
         query["item_id"] = item_id
@@ -1144,15 +3057,46 @@ async def get_inventory_movements(
         query["type"] = type
     if doctor_id:
         query["doctor_id"] = doctor_id
-    
-    movements = await db.inventory_movements.find(query).sort("created_at", -1).to_list(500)
+    return query
+
+@admin_router.get("/inventory/movements")
+async def get_inventory_movements(
+    response: Response,
+    item_id: Optional[str] = None,
+    type: Optional[str] = None,
+    doctor_id: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    current_user: dict = Depends(get_staff_user)
+):
+    query = build_movements_query(item_id, type, doctor_id)
+    movements = await paginate(
+        db.inventory_movements, query, [("created_at", DESCENDING), ("id", DESCENDING)],
+        response, limit, cursor, include_total
+    )
     return serialize_docs(movements)
 
 # ==================== PATIENTS ROUTES ====================
 
 @admin_router.get("/patients")
-async def get_all_patients(current_user: dict = Depends(get_staff_user)):
-    patients = await db.users.find().sort("name", 1).to_list(1000)
+async def get_all_patients(
+    response: Response,
+    search: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    current_user: dict = Depends(get_staff_user)
+):
+    """Patients by name; `search` matches part of the name (any case) or CPF"""
+    query = {}
+    if search and search.strip():
+        pattern = re.escape(search.strip())
+        query = {"$or": [{"name": {"$regex": pattern, "$options": "i"}}, {"cpf": {"$regex": pattern}}]}
+    patients = await paginate(
+        db.users, query, [("name", ASCENDING), ("id", ASCENDING)],
+        response, limit, cursor, include_total
+    )
     return [UserResponse(**{
         "id": p["id"],
         "name": p["name"],
@@ -1176,23 +3120,15 @@ async def get_patient(patient_id: str, current_user: dict = Depends(get_staff_us
     appointments = await db.appointments.find({"user_id": patient_id}).sort("created_at", -1).to_list(100)
     
     # Separate into history and upcoming
-    now_brazil = get_brazil_now()
+    now = datetime.utcnow()
     history = []
     upcoming = []
     
     for apt in appointments:
         apt_resp = AppointmentResponse(**apt)
-        apt_date = parse_br_date(apt.get("date", ""))
-        if apt_date:
-            try:
-                hour, minute = apt.get("time", "00:00").split(":")
-                apt_datetime = apt_date.replace(hour=int(hour), minute=int(minute))
-                if apt_datetime < now_brazil or apt.get("status") in ["concluido", "cancelado"]:
-                    history.append(apt_resp)
-                else:
-                    upcoming.append(apt_resp)
-            except (ValueError, AttributeError):
-                history.append(apt_resp)
+        starts_at = apt.get("starts_at")
+        if starts_at and starts_at >= now and apt.get("status") not in ["concluido", "cancelado"]:
+            upcoming.append(apt_resp)
         else:
             history.append(apt_resp)
     
@@ -1224,6 +3160,7 @@ async def update_patient(patient_id: str, data: PatientUpdate, current_user: dic
     result = await db.users.update_one({"id": patient_id}, {"$set": update_dict})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Paciente não encontrado")
+    invalidate_principal("patient", patient_id)
     
     patient = await db.users.find_one({"id": patient_id})
     return UserResponse(**{
@@ -1242,19 +3179,33 @@ async def update_patient(patient_id: str, data: PatientUpdate, current_user: dic
 # ==================== DOCUMENT TEMPLATES ROUTES ====================
 
 @admin_router.get("/document-templates")
-async def get_document_templates(current_user: dict = Depends(get_staff_user)):
-    templates = await db.document_templates.find().to_list(10)
-    return serialize_docs(templates)
+async def get_document_templates(request: Request, current_user: dict = Depends(get_staff_user)):
+    async def build():
+        return serialize_docs(await db.document_templates.find().to_list(10))
+    return await conditional_json(request, ("document_templates",), "document_templates", build, "private, no-cache")
 
 @admin_router.put("/document-templates/{template_type}")
 async def update_document_template(template_type: str, data: DocumentTemplateUpdate, current_user: dict = Depends(get_staff_user)):
+    unknown = unknown_placeholders(data.content)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Campos desconhecidos no modelo: {', '.join('{' + name + '}' for name in unknown)}"
+        )
     await db.document_templates.update_one(
         {"type": template_type},
         {"$set": {"content": data.content, "updated_at": datetime.utcnow()}}
     )
+    invalidate_document_template(template_type)
     template = await db.document_templates.find_one({"type": template_type})
     return serialize_doc(template)
 
+def invalidate_document_template(template_type, broadcast=True):
+    bump_generation("document_templates")
+    template_cache.invalidate(template_type)
+    if broadcast:
+        invalidation_bus.publish("document_template", template_type)
+
 @admin_router.post("/documents/generate")
 async def generate_document(data: DocumentGenerate, current_user: dict = Depends(get_staff_user)):
     template = await db.document_templates.find_one({"type": data.template_type})
@@ -1262,37 +3213,15 @@ async def generate_document(data: DocumentGenerate, current_user: dict = Depends
         raise HTTPException(status_code=404, detail="Template não encontrado")
     
     patient = await db.users.find_one({"id": data.patient_id})
-    doctor = await db.doctors.find_one({"id": data.doctor_id})
-    unit = await db.units.find_one({"id": doctor["unit_id"]}) if doctor else None
+    doctor = await catalog.get("doctors", data.doctor_id)
+    unit = await catalog.get("units", doctor["unit_id"]) if doctor else None
     
     if not patient or not doctor:
         raise HTTPException(status_code=404, detail="Paciente ou doutor não encontrado")
     
     # Replace placeholders
-    content = template["content"]
     now = datetime.now()
-    
-    replacements = {
-        "{NOME_PACIENTE}": patient["name"],
-        "{CPF_PACIENTE}": patient["cpf"],
-        "{NOME_DOUTOR}": doctor["name"],
-        "{CRO_DOUTOR}": doctor.get("cro", ""),
-        "{DATA}": now.strftime("%d/%m/%Y"),
-        "{DATA_EXTENSO}": now.strftime("%d de %B de %Y").replace("January", "Janeiro").replace("February", "Fevereiro").replace("March", "Março").replace("April", "Abril").replace("May", "Maio").replace("June", "Junho").replace("July", "Julho").replace("August", "Agosto").replace("September", "Setembro").replace("October", "Outubro").replace("November", "Novembro").replace("December", "Dezembro"),
-        "{CIDADE}": "Manaus - AM",
-        "{NOME_CLINICA}": "Odonto Sinditur",
-        "{ENDERECO_CLINICA}": unit["address"] if unit else "",
-        "{DIAS_AFASTAMENTO}": str(data.custom_fields.get("dias_afastamento", "1")),
-        "{DATA_INICIO}": data.custom_fields.get("data_inicio", now.strftime("%d/%m/%Y")),
-        "{DATA_FIM}": data.custom_fields.get("data_fim", ""),
-        "{PROCEDIMENTOS}": data.custom_fields.get("procedimentos", ""),
-        "{PROCEDIMENTO}": data.custom_fields.get("procedimento", ""),
-        "{MEDICAMENTOS}": data.custom_fields.get("medicamentos", ""),
-        "{OBSERVACOES}": data.custom_fields.get("observacoes", ""),
-    }
-    
-    for key, value in replacements.items():
-        content = content.replace(key, str(value))
+    content = template_cache.get(template).render(document_values(patient, doctor, unit, data.custom_fields, now))
     
     return {
         "content": content,
@@ -1304,90 +3233,223 @@ async def generate_document(data: DocumentGenerate, current_user: dict = Depends
     }
 
 @admin_router.post("/documents/generate-pdf")
-async def generate_document_pdf(data: DocumentGenerate, current_user: dict = Depends(get_staff_user)):
+async def generate_document_pdf(data: DocumentGenerate, format: str = "pdf", current_user: dict = Depends(get_staff_user)):
+    """Render a document as PDF.
+    
+    Returns application/pdf by default; format=base64 keeps the old JSON
+    response with the PDF base64-encoded.
+    """
     # First generate the content
     template = await db.document_templates.find_one({"type": data.template_type})
     if not template:
         raise HTTPException(status_code=404, detail="Template não encontrado")
     
     patient = await db.users.find_one({"id": data.patient_id})
-    doctor = await db.doctors.find_one({"id": data.doctor_id})
-    unit = await db.units.find_one({"id": doctor["unit_id"]}) if doctor else None
+    doctor = await catalog.get("doctors", data.doctor_id)
+    unit = await catalog.get("units", doctor["unit_id"]) if doctor else None
     
     if not patient or not doctor:
         raise HTTPException(status_code=404, detail="Paciente ou doutor não encontrado")
     
-    content = template["content"]
     now = datetime.now()
+    content = template_cache.get(template).render(document_values(patient, doctor, unit, data.custom_fields, now))
     
-    meses_pt = {
-        "January": "Janeiro", "February": "Fevereiro", "March": "Março",
-        "April": "Abril", "May": "Maio", "June": "Junho",
-        "July": "Julho", "August": "Agosto", "September": "Setembro",
-        "October": "Outubro", "November": "Novembro", "December": "Dezembro"
-    }
+    # Generate PDF
+    pdf_bytes = await render_pdf_cached(content)
+    filename = f"{data.template_type}_{patient['name'].replace(' ', '_')}_{now.strftime('%Y%m%d')}.pdf"
+    
+    if format == "base64":
+        return {
+            "pdf_base64": base64.b64encode(pdf_bytes).decode(),
+            "filename": filename
+        }
+    return Response(
+        content=pdf_bytes,
+        media_type="application/pdf",
+        headers={"Content-Disposition": content_disposition(filename)}
+    )
+
+@admin_router.post("/documents/generate-batch")
+async def generate_document_batch(data: DocumentBatchGenerate, current_user: dict = Depends(get_staff_user)):
+    """Render one document per appointment, as a single merged PDF or a ZIP.
     
-    data_extenso = now.strftime("%d de %B de %Y")
-    for en, pt in meses_pt.items():
-        data_extenso = data_extenso.replace(en, pt)
-    
-    replacements = {
-        "{NOME_PACIENTE}": patient["name"],
-        "{CPF_PACIENTE}": patient["cpf"],
-        "{NOME_DOUTOR}": doctor["name"],
-        "{CRO_DOUTOR}": doctor.get("cro", ""),
-        "{DATA}": now.strftime("%d/%m/%Y"),
-        "{DATA_EXTENSO}": data_extenso,
-        "{CIDADE}": "Manaus - AM",
-        "{NOME_CLINICA}": "Odonto Sinditur",
-        "{ENDERECO_CLINICA}": unit["address"] if unit else "",
-        "{DIAS_AFASTAMENTO}": str(data.custom_fields.get("dias_afastamento", "1")),
-        "{DATA_INICIO}": data.custom_fields.get("data_inicio", now.strftime("%d/%m/%Y")),
-        "{DATA_FIM}": data.custom_fields.get("data_fim", ""),
-        "{PROCEDIMENTOS}": data.custom_fields.get("procedimentos", ""),
-        "{PROCEDIMENTO}": data.custom_fields.get("procedimento", ""),
-        "{MEDICAMENTOS}": data.custom_fields.get("medicamentos", ""),
-        "{OBSERVACOES}": data.custom_fields.get("observacoes", ""),
-    }
+    Appointments come from appointment_ids or from the date/doctor filter
+    (cancelled ones excluded). Patients are fetched with a single $in query;
+    doctors and units come from the catalog cache.
+    """
+    if data.format not in ("pdf", "zip"):
+        raise HTTPException(status_code=400, detail="Formato inválido")
+    template = await db.document_templates.find_one({"type": data.template_type})
+    if not template:
+        raise HTTPException(status_code=404, detail="Template não encontrado")
     
-    for key, value in replacements.items():
-        content = content.replace(key, str(value))
+    if data.appointment_ids:
+        query = {"id": {"$in": data.appointment_ids}}
+    elif data.date:
+        query = build_appointments_query(date=data.date, doctor_id=data.doctor_id)
+        query["status"] = {"$ne": "cancelado"}
+    else:
+        raise HTTPException(status_code=400, detail="Informe os agendamentos ou a data")
     
-    # Generate PDF
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=2*cm, bottomMargin=2*cm, leftMargin=2*cm, rightMargin=2*cm)
-    
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle('Title', parent=styles['Heading1'], alignment=TA_CENTER, fontSize=14, spaceAfter=20)
-    body_style = ParagraphStyle('Body', parent=styles['Normal'], alignment=TA_JUSTIFY, fontSize=12, leading=18, spaceAfter=12)
-    signature_style = ParagraphStyle('Signature', parent=styles['Normal'], alignment=TA_CENTER, fontSize=12, spaceBefore=40)
-    
-    story = []
-    
-    # Header
-    story.append(Paragraph("ODONTO SINDITUR", title_style))
-    story.append(Spacer(1, 20))
-    
-    # Content
-    lines = content.split('\n')
-    for line in lines:
-        if line.strip():
-            if line.startswith('_'):
-                story.append(Paragraph(line, signature_style))
-            else:
-                story.append(Paragraph(line, body_style))
-        else:
-            story.append(Spacer(1, 12))
+    appointments = await db.appointments.find(query).sort([("starts_at", ASCENDING), ("id", ASCENDING)]).to_list(DOCUMENT_BATCH_MAX + 1)
+    if not appointments:
+        raise HTTPException(status_code=404, detail="Nenhum agendamento encontrado")
+    if len(appointments) > DOCUMENT_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"Máximo de {DOCUMENT_BATCH_MAX} documentos por lote")
     
-    doc.build(story)
+    patient_ids = list({apt["user_id"] for apt in appointments})
+    patients = {p["id"]: p async for p in db.users.find({"id": {"$in": patient_ids}})}
     
-    pdf_bytes = buffer.getvalue()
-    pdf_base64 = base64.b64encode(pdf_bytes).decode()
+    compiled = template_cache.get(template)
+    now = datetime.now()
+    documents = []
+    for apt in appointments:
+        patient = patients.get(apt["user_id"])
+        doctor = await catalog.get("doctors", apt["doctor_id"])
+        if not patient or not doctor:
+            continue
+        unit = await catalog.get("units", doctor["unit_id"])
+        custom_fields = {"data_inicio": apt["date"], **(data.custom_fields or {})}
+        content = compiled.render(document_values(patient, doctor, unit, custom_fields, now))
+        filename = f"{len(documents) + 1:03d}_{data.template_type}_{patient['name'].replace(' ', '_')}_{rollup_day(apt['date']) or ''}.pdf"
+        documents.append((filename, content))
+    if not documents:
+        raise HTTPException(status_code=404, detail="Paciente ou doutor não encontrado")
     
-    return {
-        "pdf_base64": pdf_base64,
-        "filename": f"{data.template_type}_{patient['name'].replace(' ', '_')}_{now.strftime('%Y%m%d')}.pdf"
-    }
+    batch_name = f"{data.template_type}_{rollup_day(data.date) if data.date else now.strftime('%Y-%m-%d')}"
+    if data.format == "pdf":
+        contents = [content for _, content in documents]
+        chunks = [contents[i:i + DOCUMENT_BATCH_CHUNK] for i in range(0, len(contents), DOCUMENT_BATCH_CHUNK)]
+        parts = await asyncio.gather(*[pdf_pool.run(pdf_render.render_documents_pdf, chunk) for chunk in chunks])
+        body = parts[0] if len(parts) == 1 else await pdf_pool.run(pdf_render.merge_pdfs, parts)
+        media_type = "application/pdf"
+        filename = f"{batch_name}.pdf"
+    else:
+        pdfs = await asyncio.gather(*[render_pdf_cached(content) for _, content in documents])
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+            for (name, _), pdf_bytes in zip(documents, pdfs):
+                archive.writestr(name, pdf_bytes)
+        body = buffer.getvalue()
+        media_type = "application/zip"
+        filename = f"{batch_name}.zip"
+    
+    logger.info(f"Generated {len(documents)} {data.template_type} documents as {data.format}")
+    return Response(
+        content=body,
+        media_type=media_type,
+        headers={"Content-Disposition": content_disposition(filename)}
+    )
+
+# ==================== EXPORT ROUTES ====================
+
+EXPORT_BATCH_SIZE = 1000
+
+APPOINTMENT_EXPORT_FIELDS = [
+    "id", "date", "time", "starts_at", "ends_at", "status", "user_id", "user_name", "user_cpf",
+    "unit_id", "unit_name", "service_id", "service_name", "service_price",
+    "doctor_id", "doctor_name", "paid_value", "notes", "created_at", "completed_at"
+]
+
+EXPORT_FIELDS = {
+    "appointments": APPOINTMENT_EXPORT_FIELDS,
+    "financials": APPOINTMENT_EXPORT_FIELDS,
+    "patients": [
+        "id", "name", "cpf", "birth_date", "phone", "address", "gender", "associate", "company", "created_at"
+    ],
+    "movements": [
+        "id", "item_id", "item_name", "type", "quantity", "doctor_id", "doctor_name", "notes", "created_at", "created_by"
+    ],
+}
+
+def _export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return "" if value is None else value
+
+async def _stream_export(collection, query, sort, fields, fmt):
+    """Yield the export one cursor batch at a time"""
+    projection = {"_id": 0, **{f: 1 for f in fields}}
+    cursor = collection.find(query, projection).sort(sort).batch_size(EXPORT_BATCH_SIZE)
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == "csv":
+        # BOM so spreadsheet programs detect UTF-8 accents
+        buffer.write("\ufeff")
+        writer.writerow(fields)
+    
+    rows = 0
+    async for doc in cursor:
+        if fmt == "csv":
+            writer.writerow([_export_value(doc.get(f)) for f in fields])
+        else:
+            buffer.write(json.dumps({f: _export_value(doc.get(f)) for f in fields}, ensure_ascii=False))
+            buffer.write("\n")
+        rows += 1
+        if rows % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    if buffer.tell():
+        yield buffer.getvalue()
+
+@admin_router.get("/export/{collection}")
+async def export_collection(
+    collection: str,
+    format: str = "csv",
+    status: Optional[str] = None,
+    date: Optional[str] = None,
+    doctor_id: Optional[str] = None,
+    unit_id: Optional[str] = None,
+    item_id: Optional[str] = None,
+    type: Optional[str] = None,
+    month: Optional[int] = Query(None, ge=1, le=12),
+    year: Optional[int] = None,
+    current_user: dict = Depends(get_staff_user)
+):
+    """Stream a collection as CSV or NDJSON.
+    
+    appointments accepts the filters of GET /admin/appointments, movements
+    those of GET /admin/inventory/movements, and financials exports the
+    completed appointments, optionally limited to a month/year and unit.
+    """
+    if collection not in EXPORT_FIELDS:
+        raise HTTPException(status_code=404, detail="Exportação não encontrada")
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Formato inválido")
+    
+    if collection == "appointments":
+        source = db.appointments
+        query = build_appointments_query(status, date, doctor_id, unit_id)
+        sort = [("starts_at", DESCENDING), ("id", DESCENDING)]
+    elif collection == "financials":
+        source = db.appointments
+        query = build_appointments_query("concluido", date, doctor_id, unit_id)
+        if year:
+            if month:
+                range_start, range_end = br_month_range(year, month)
+            else:
+                range_start, range_end = br_month_range(year, 1)[0], br_month_range(year + 1, 1)[0]
+            query["starts_at"] = {"$gte": range_start, "$lt": range_end}
+        sort = [("starts_at", DESCENDING), ("id", DESCENDING)]
+    elif collection == "movements":
+        source = db.inventory_movements
+        query = build_movements_query(item_id, type, doctor_id)
+        sort = [("created_at", DESCENDING), ("id", DESCENDING)]
+    else:
+        source = db.users
+        query = {}
+        sort = [("name", ASCENDING), ("id", ASCENDING)]
+    
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    filename = f"{collection}_{get_brazil_now().strftime('%Y%m%d_%H%M')}.{format}"
+    return StreamingResponse(
+        _stream_export(source, query, sort, EXPORT_FIELDS[collection], format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 # ==================== ROOT ROUTES ====================
 
@@ -1399,6 +3461,31 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+@admin_router.get("/metrics")
+async def get_metrics(current_user: dict = Depends(get_staff_user)):
+    """In-process cache and pool counters of this worker"""
+    return {
+        "principal_cache": principal_cache.stats(),
+        "password_pool": password_pool.stats(),
+        "pdf_pool": pdf_pool.stats(),
+        "pdf_cache": pdf_cache.stats(),
+        "template_cache": template_cache.stats(),
+        "catalog": catalog.stats(),
+        "slot_bitmaps": slot_bitmaps.stats(),
+        "reminders": reminder_scheduler.stats(),
+        "invalidation_bus": invalidation_bus.stats()
+    }
+
+@admin_router.post("/slot-bitmaps/rebuild")
+async def rebuild_slot_bitmaps(days: int = Query(31, ge=1, le=SLOT_BITMAP_HORIZON_DAYS), current_user: dict = Depends(get_staff_user)):
+    """Drop this worker's slot bitmaps and rebuild the next days from appointments"""
+    slot_bitmaps.clear()
+    today = datetime.now(BRT)
+    dates = [(today + timedelta(days=i)).strftime("%d/%m/%Y") for i in range(days)]
+    doctor_ids = [d["id"] for d in await catalog.all("doctors")]
+    await slot_bitmaps.ensure(doctor_ids, dates)
+    return slot_bitmaps.stats()
+
 # Include routers
 fastapi_app.include_router(api_router)
 fastapi_app.include_router(admin_router)
@@ -1409,15 +3496,46 @@ fastapi_app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag", "Content-Disposition"],
 )
 
+# Other workers' invalidations are applied locally without re-publishing
+invalidation_bus.on("principal", lambda user_type, user_id: invalidate_principal(user_type, user_id, broadcast=False))
+invalidation_bus.on("catalog", lambda name: catalog.invalidate(name, broadcast=False))
+invalidation_bus.on("document_template", lambda template_type: invalidate_document_template(template_type, broadcast=False))
+invalidation_bus.on("slot_day", slot_bitmaps.drop_day)
+
+def drop_local_caches():
+    principal_cache.clear()
+    for name in CatalogCache.COLLECTIONS:
+        catalog.invalidate(name, broadcast=False)
+    bump_generation("document_templates")
+    template_cache.clear()
+    slot_bitmaps.clear()
+
+invalidation_bus.on_resubscribe(drop_local_caches)
+
 @fastapi_app.on_event("startup")
 async def startup_event():
+    await ensure_indexes()
+    await ensure_appointment_windows()
+    await ensure_appointment_slots_claimed()
+    await flush_inventory_outbox()
+    await ensure_low_stock_flags()
+    await ensure_financial_rollups()
     await seed_data()
+    await migrate_doctor_photos()
+    invalidation_bus.start()
+    await catalog.load_all()
+    reminder_scheduler.start()
 
 @fastapi_app.on_event("shutdown")
 async def shutdown_db_client():
+    await reminder_scheduler.stop()
+    await invalidation_bus.stop()
     client.close()
+    password_pool.shutdown()
+    pdf_pool.shutdown()
 
 # Wrap FastAPI with Socket.IO - this is the ASGI app uvicorn will load
 app = socketio.ASGIApp(sio, fastapi_app)
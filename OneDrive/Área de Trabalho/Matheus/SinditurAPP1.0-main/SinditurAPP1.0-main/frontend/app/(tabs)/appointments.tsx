@@ -14,7 +14,7 @@ import {
 import { SafeAreaView } from 'react-native-safe-area-context';
 import { Ionicons } from '@expo/vector-icons';
 import { Calendar, LocaleConfig } from 'react-native-calendars';
-import { unitsAPI, servicesAPI, doctorsAPI, appointmentsAPI } from '../../services/api';
+import { API_URL, unitsAPI, servicesAPI, doctorsAPI, appointmentsAPI } from '../../services/api';
 
 // Configure Portuguese locale
 LocaleConfig.locales['pt-br'] = {
@@ -52,7 +52,7 @@ interface Doctor {
   name: string;
   specialty: string;
   unit_id: string;
-  photo_base64: string | null;
+  photo_url: string | null;
   bio: string;
   available_days: string[];
 }
@@ -66,7 +66,8 @@ export default function AppointmentsScreen() {
   const [units, setUnits] = useState<Unit[]>([]);
   const [services, setServices] = useState<Service[]>([]);
   const [doctors, setDoctors] = useState<Doctor[]>([]);
-  const [bookedTimes, setBookedTimes] = useState<string[]>([]);
+  // Free start times per DD/MM/YYYY date for the selected doctor and service
+  const [freeTimes, setFreeTimes] = useState<Record<string, string[]>>({});
 
   const [selectedUnit, setSelectedUnit] = useState<Unit | null>(null);
   const [selectedService, setSelectedService] = useState<Service | null>(null);
@@ -85,6 +86,9 @@ export default function AppointmentsScreen() {
   // Get today's date in YYYY-MM-DD format
   const today = new Date().toISOString().split('T')[0];
 
+  // Days of availability fetched per request
+  const AVAILABILITY_WINDOW_DAYS = 14;
+
   useEffect(() => {
     loadData();
   }, []);
@@ -95,6 +99,13 @@ export default function AppointmentsScreen() {
     }
   }, [selectedUnit]);
 
+  useEffect(() => {
+    setFreeTimes({});
+    if (step === 4 && selectedDoctor && selectedService) {
+      loadAvailability(selectedDate || today, true);
+    }
+  }, [step, selectedDoctor, selectedService]);
+
   const loadData = async () => {
     try {
       const [unitsRes, servicesRes] = await Promise.all([
@@ -125,16 +136,37 @@ export default function AppointmentsScreen() {
     return `${day}/${month}/${year}`;
   };
 
-  const loadBookedSlots = async (dateStr: string) => {
-    if (!selectedDoctor) return;
+  const addDays = (dateString: string, days: number) => {
+    const [year, month, day] = dateString.split('-').map((part) => parseInt(part));
+    const date = new Date(year, month - 1, day + days);
+    const pad = (n: number) => String(n).padStart(2, '0');
+    return `${date.getFullYear()}-${pad(date.getMonth() + 1)}-${pad(date.getDate())}`;
+  };
+
+  // Fetch free times for a window of days starting at dateStr in one request
+  const loadAvailability = async (dateStr: string, reset = false) => {
+    if (!selectedUnit || !selectedDoctor || !selectedService) return;
     setLoadingSlots(true);
     try {
-      const brDate = formatDateToBrazilian(dateStr);
-      const response = await appointmentsAPI.getBookedSlots(selectedDoctor.id, brDate);
-      setBookedTimes(response.data.booked_times || []);
+      const lastDay = addDays(dateStr, AVAILABILITY_WINDOW_DAYS - 1);
+      const response = await appointmentsAPI.getAvailability({
+        unit_id: selectedUnit.id,
+        service_id: selectedService.id,
+        doctor_id: selectedDoctor.id,
+        from: formatDateToBrazilian(dateStr),
+        to: formatDateToBrazilian(lastDay),
+      });
+      const loaded: Record<string, string[]> = {};
+      for (let i = 0; i < AVAILABILITY_WINDOW_DAYS; i++) {
+        loaded[formatDateToBrazilian(addDays(dateStr, i))] = [];
+      }
+      const doctor = response.data.doctors.find((d: any) => d.doctor_id === selectedDoctor.id);
+      doctor?.days.forEach((day: any) => {
+        loaded[day.date] = day.times;
+      });
+      setFreeTimes((prev) => (reset ? loaded : { ...prev, ...loaded }));
     } catch (error) {
-      console.error('Error loading booked slots:', error);
-      setBookedTimes([]);
+      console.error('Error loading availability:', error);
     } finally {
       setLoadingSlots(false);
     }
@@ -144,7 +176,9 @@ export default function AppointmentsScreen() {
     setSelectedDate(day.dateString);
     setSelectedDateFormatted(formatDateToBrazilian(day.dateString));
     setSelectedTime(''); // Reset time selection
-    loadBookedSlots(day.dateString);
+    if (!freeTimes[formatDateToBrazilian(day.dateString)]) {
+      loadAvailability(day.dateString);
+    }
   };
 
   const isTimePast = (time: string): boolean => {
@@ -172,7 +206,8 @@ export default function AppointmentsScreen() {
   };
 
   const isTimeBooked = (time: string): boolean => {
-    return bookedTimes.includes(time);
+    const free = freeTimes[selectedDateFormatted];
+    return free !== undefined && !free.includes(time) && !isTimePast(time);
   };
 
   const getTimeSlotState = (time: string): 'available' | 'booked' | 'past' => {
@@ -210,7 +245,7 @@ export default function AppointmentsScreen() {
             setSelectedDateFormatted('');
             setSelectedTime('');
             setNotes('');
-            setBookedTimes([]);
+            setFreeTimes({});
           },
         },
       ]);
@@ -354,9 +389,9 @@ export default function AppointmentsScreen() {
             onPress={() => setSelectedDoctor(doctor)}
           >
             <View style={styles.doctorPhotoContainer}>
-              {doctor.photo_base64 ? (
+              {doctor.photo_url ? (
                 <Image
-                  source={{ uri: `data:image/jpeg;base64,${doctor.photo_base64}` }}
+                  source={{ uri: `${API_URL}${doctor.photo_url}&size=md` }}
                   style={styles.doctorPhoto}
                 />
               ) : (
@@ -41,8 +41,7 @@ export default function HistoryScreen() {
 
   const loadAppointments = async () => {
     try {
-      const response = await appointmentsAPI.getAll();
-      setAppointments(response.data);
+      setAppointments(await appointmentsAPI.getAllPages());
     } catch (error) {
       console.error('Error loading appointments:', error);
     } finally {
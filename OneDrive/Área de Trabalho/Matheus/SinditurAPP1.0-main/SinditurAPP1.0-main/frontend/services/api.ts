@@ -1,7 +1,7 @@
 import axios from 'axios';
 import AsyncStorage from '@react-native-async-storage/async-storage';
 
-const API_URL = process.env.EXPO_PUBLIC_BACKEND_URL || 'http://localhost:8001';
+export const API_URL = process.env.EXPO_PUBLIC_BACKEND_URL || 'http://localhost:8001';
 
 const api = axios.create({
   baseURL: `${API_URL}/api`,
@@ -61,12 +61,32 @@ export const appointmentsAPI = {
     notes?: string;
   }) => api.post('/appointments', data),
   
-  getAll: () => api.get('/appointments'),
+  getAll: (params?: { cursor?: string; limit?: number }) => api.get('/appointments', { params }),
+
+  // Every appointment of the patient, following X-Next-Cursor to the last page
+  getAllPages: async () => {
+    const rows: any[] = [];
+    let cursor: string | undefined;
+    do {
+      const response = await api.get('/appointments', { params: cursor ? { cursor } : {} });
+      rows.push(...response.data);
+      cursor = response.headers['x-next-cursor'] || undefined;
+    } while (cursor);
+    return rows;
+  },
   
   cancel: (id: string) => api.delete(`/appointments/${id}`),
 
   getBookedSlots: (doctorId: string, date: string) =>
     api.get('/appointments/booked-slots', { params: { doctor_id: doctorId, date } }),
+
+  getAvailability: (params: {
+    unit_id: string;
+    service_id: string;
+    doctor_id?: string;
+    from: string;
+    to: string;
+  }) => api.get('/appointments/availability', { params }),
   
   getReminders: () => api.get('/appointments/reminders'),
 };
@@ -0,0 +1,18 @@
+from server import _etag_matches
+
+
+def test_etag_matches_strong_and_list():
+    assert _etag_matches('"abc"', '"abc"')
+    assert _etag_matches('"x", "abc"', '"abc"')
+    assert not _etag_matches('"x"', '"abc"')
+    assert not _etag_matches(None, '"abc"')
+
+
+def test_etag_matches_weak_validator():
+    assert _etag_matches('W/"abc"', '"abc"')
+    assert _etag_matches('"x", W/"abc"', '"abc"')
+    assert not _etag_matches('W/"x"', '"abc"')
+
+
+def test_etag_matches_wildcard():
+    assert _etag_matches("*", '"abc"')
@@ -0,0 +1,118 @@
+import asyncio
+import json
+
+from server import InvalidationBus
+
+
+class FakeBroker:
+    """In-memory stand-in for Redis pub/sub shared by several buses"""
+
+    def __init__(self):
+        self.queues = []
+        self.closed = 0
+
+    def client(self):
+        return FakeRedis(self)
+
+
+class FakeRedis:
+    def __init__(self, broker):
+        self.broker = broker
+
+    async def publish(self, channel, message):
+        for queue in self.broker.queues:
+            queue.put_nowait(message.encode())
+
+    def pubsub(self):
+        return FakePubSub(self.broker)
+
+    async def aclose(self):
+        pass
+
+
+class FakePubSub:
+    def __init__(self, broker):
+        self.broker = broker
+        self.queue = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self.broker.queues.append(self.queue)
+
+    async def listen(self):
+        while True:
+            yield {"type": "message", "data": await self.queue.get()}
+
+    async def aclose(self):
+        self.broker.queues.remove(self.queue)
+        self.broker.closed += 1
+
+
+def _start(bus, broker):
+    bus._redis = broker.client()
+    bus._task = asyncio.create_task(bus._listen())
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_publish_reaches_other_workers_only():
+    async def run():
+        broker = FakeBroker()
+        sender, receiver = InvalidationBus("redis://fake", "test"), InvalidationBus("redis://fake", "test")
+        seen = {"sender": [], "receiver": []}
+        sender.on("catalog", seen["sender"].append)
+        receiver.on("catalog", seen["receiver"].append)
+        _start(sender, broker)
+        _start(receiver, broker)
+        await _settle()
+
+        sender.publish("catalog", "units")
+        await _settle()
+
+        assert seen == {"sender": [], "receiver": ["units"]}
+        assert sender.stats()["published"] == 1
+        assert receiver.stats()["received"] == 1
+        await sender.stop()
+        await receiver.stop()
+        assert broker.closed == 2
+
+    asyncio.run(run())
+
+
+def test_malformed_messages_are_skipped_without_resubscribing():
+    async def run():
+        broker = FakeBroker()
+        bus = InvalidationBus("redis://fake", "test")
+        seen = []
+        resubscribes = []
+        bus.on("principal", lambda user_type, user_id: seen.append((user_type, user_id)))
+        bus.on("boom", lambda: 1 / 0)
+        bus.on_resubscribe(lambda: resubscribes.append(1))
+        _start(bus, broker)
+        await _settle()
+
+        publisher = broker.client()
+        for message in (
+            "not json",
+            json.dumps({"origin": "other", "kind": "boom", "args": []}),
+            json.dumps({"origin": "other", "kind": "principal", "args": ["staff"]}),
+            json.dumps({"origin": "other", "kind": "unknown", "args": []}),
+            json.dumps({"origin": "other", "kind": "principal", "args": ["staff", "s1"]}),
+        ):
+            await publisher.publish("test", message)
+        await _settle()
+
+        assert seen == [("staff", "s1")]
+        assert bus.stats()["errors"] == 3
+        assert resubscribes == [1]
+        await bus.stop()
+
+    asyncio.run(run())
+
+
+def test_publish_is_a_no_op_without_redis():
+    bus = InvalidationBus("redis://fake", "test")
+    bus.publish("catalog", "units")
+    assert bus.stats()["published"] == 0
@@ -0,0 +1,47 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from pymongo import ASCENDING, DESCENDING
+
+from server import _keyset_filter, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    values = [datetime(2024, 3, 5, 14, 30, 0, 123000), "Maria", 7, None]
+    assert decode_cursor(encode_cursor(values), len(values)) == values
+
+
+def test_cursor_is_url_safe_without_padding():
+    cursor = encode_cursor(["José da Silva ~?&", "a" * 17])
+    assert "=" not in cursor
+    assert all(c.isalnum() or c in "-_" for c in cursor)
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!!", "e30", "", encode_cursor([{"x": 1}])])
+def test_decode_cursor_rejects_garbage(cursor):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor, 1)
+    assert exc.value.status_code == 400
+
+
+def test_decode_cursor_rejects_wrong_size():
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(encode_cursor(["a", "b"]), 3)
+    assert exc.value.status_code == 400
+
+
+def test_keyset_filter_descending():
+    when = datetime(2024, 1, 1)
+    assert _keyset_filter([("starts_at", DESCENDING), ("id", DESCENDING)], [when, "x"]) == {"$or": [
+        {"starts_at": {"$lt": when}},
+        {"starts_at": when, "id": {"$lt": "x"}},
+    ]}
+
+
+def test_keyset_filter_ascending_three_fields():
+    assert _keyset_filter([("a", ASCENDING), ("b", ASCENDING), ("id", ASCENDING)], [1, 2, "z"]) == {"$or": [
+        {"a": {"$gt": 1}},
+        {"a": 1, "b": {"$gt": 2}},
+        {"a": 1, "b": 2, "id": {"$gt": "z"}},
+    ]}
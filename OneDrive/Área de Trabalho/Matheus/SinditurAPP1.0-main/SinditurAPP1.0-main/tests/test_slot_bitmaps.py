@@ -0,0 +1,114 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import server
+from server import BRT, APPOINTMENT_TIMES, SlotBitmaps, bitmap_intervals, slot_day_in_window, slot_mask
+
+
+def _slot(time_str):
+    hour, minute = time_str.split(":")
+    return (int(hour) * 60 + int(minute)) // 15
+
+
+def _appointment(time_str, minutes):
+    starts_at = datetime(2025, 1, 6, *map(int, time_str.split(":")))
+    return {"time": time_str, "starts_at": starts_at, "ends_at": starts_at + timedelta(minutes=minutes)}
+
+
+def test_slot_mask_covers_whole_slots():
+    assert slot_mask("08:00", 30) == 0b11 << _slot("08:00")
+    assert slot_mask("08:00", 20) == 0b11 << _slot("08:00")
+    assert slot_mask("08:10", 10) == 0b11 << _slot("08:00")
+
+
+def test_slot_mask_without_duration_takes_one_slot():
+    assert slot_mask("09:30", 0) == 1 << _slot("09:30")
+    assert slot_mask("09:30", None) == 1 << _slot("09:30")
+
+
+def test_bitmap_intervals():
+    assert bitmap_intervals(0) == []
+    bits = slot_mask("08:00", 45) | slot_mask("14:00", 15)
+    assert bitmap_intervals(bits) == [("08:00", "08:45"), ("14:00", "14:15")]
+
+
+def test_bitmap_intervals_merges_adjacent_appointments():
+    assert bitmap_intervals(slot_mask("08:00", 30) | slot_mask("08:30", 30)) == [("08:00", "09:00")]
+
+
+def test_free_times_skips_overlapping_starts():
+    bitmaps = SlotBitmaps(ttl=60, max_days=100)
+    bitmaps.fill({("doctor-1", "06/01/2025"): [_appointment("09:00", 60)]})
+    free = bitmaps.free_times("doctor-1", "06/01/2025", 30)
+    assert "08:00" in free
+    assert "08:30" in free
+    assert "09:00" not in free
+    assert "09:30" not in free
+    assert "10:00" in free
+
+
+def test_free_times_accounts_for_requested_duration():
+    bitmaps = SlotBitmaps(ttl=60, max_days=100)
+    bitmaps.fill({("doctor-1", "06/01/2025"): [_appointment("09:00", 30)]})
+    assert "08:30" in bitmaps.free_times("doctor-1", "06/01/2025", 30)
+    assert "08:30" not in bitmaps.free_times("doctor-1", "06/01/2025", 60)
+
+
+def test_free_times_after_minute_and_unknown_day():
+    bitmaps = SlotBitmaps(ttl=60, max_days=100)
+    assert bitmaps.free_times("doctor-2", "06/01/2025", 30) == APPOINTMENT_TIMES
+    assert bitmaps.free_times("doctor-2", "06/01/2025", 30, after_minute=16 * 60) == ["16:30", "17:00", "17:30"]
+
+
+def test_fill_evicts_oldest_days_past_max_days():
+    bitmaps = SlotBitmaps(ttl=60, max_days=2)
+    bitmaps.fill({("doctor-1", "06/01/2025"): []})
+    bitmaps.fill({("doctor-1", "07/01/2025"): []})
+    bitmaps.fill({("doctor-1", "08/01/2025"): []})
+    assert bitmaps.stats()["days"] == 2
+    assert not bitmaps.has("doctor-1", "06/01/2025")
+    assert bitmaps.has("doctor-1", "08/01/2025")
+
+
+def test_slot_day_in_window():
+    today = datetime.now(BRT)
+    assert slot_day_in_window(today.strftime("%d/%m/%Y"))
+    assert not slot_day_in_window((today - timedelta(days=30)).strftime("%d/%m/%Y"))
+    assert not slot_day_in_window((today + timedelta(days=server.SLOT_BITMAP_HORIZON_DAYS + 1)).strftime("%d/%m/%Y"))
+    assert not slot_day_in_window("not a date")
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+
+
+def test_ensure_only_caches_known_doctors_inside_the_window(monkeypatch):
+    queries = []
+
+    def find(query, projection):
+        queries.append(query)
+        return _Cursor([])
+
+    monkeypatch.setattr(server, "db", SimpleNamespace(appointments=SimpleNamespace(find=find)))
+    monkeypatch.setattr(server.catalog, "_data", {**server.catalog._data, "doctors": {"doctor-1": {"id": "doctor-1"}}})
+    today = datetime.now(BRT).strftime("%d/%m/%Y")
+    bitmaps = SlotBitmaps(ttl=60, max_days=100)
+
+    asyncio.run(bitmaps.ensure(["doctor-1", "unknown"], [today, "01/01/1990"]))
+
+    assert bitmaps.stats()["days"] == 1
+    assert bitmaps.has("doctor-1", today)
+    assert queries[0]["doctor_id"] == {"$in": ["doctor-1"]}
+    assert queries[0]["date"] == {"$in": [today]}
+
+    asyncio.run(bitmaps.ensure(["unknown"], ["01/01/1990"]))
+    assert len(queries) == 1
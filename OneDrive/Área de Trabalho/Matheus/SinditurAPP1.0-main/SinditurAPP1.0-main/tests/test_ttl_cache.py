@@ -0,0 +1,44 @@
+from server import TTLCache
+
+
+def test_set_and_get():
+    cache = TTLCache(2, 60)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_evicts_least_recently_used():
+    cache = TTLCache(2, 60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+
+def test_expired_entries_are_dropped():
+    cache = TTLCache(2, -1)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+def test_set_skipped_after_invalidate_during_load():
+    cache = TTLCache(2, 60)
+    version = cache.version("a")
+    cache.invalidate("a")
+    cache.set("a", "stale", version)
+    assert cache.get("a") is None
+    cache.set("a", "fresh", cache.version("a"))
+    assert cache.get("a") == "fresh"
+
+
+def test_set_skipped_after_clear_during_load():
+    cache = TTLCache(2, 60)
+    version = cache.version("a")
+    cache.clear()
+    cache.set("a", "stale", version)
+    assert cache.get("a") is None